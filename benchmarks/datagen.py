@@ -0,0 +1,182 @@
+"""Synthetic contact center data generator for the routing benchmarks.
+
+Configuration records (skills, teams, agents, queues) go through the ORM so
+every create hook (skill keys, queue eligibility, ...) runs. History tables
+(calls, shadow profiles, conversations) are bulk inserted with
+generate_series, since millions of rows through the ORM would take hours.
+"""
+import datetime
+import random
+
+DEFAULT_VOLUMES = {
+    'skills': 200,
+    'teams': 200,
+    'agents': 10000,
+    'queues': 500,
+    'calls': 2000000,
+    'profiles': 100000,
+    'conversations': 5000000,
+}
+
+AGENT_STATUSES = ['offline', 'available', 'available', 'busy', 'on_break', 'after_call']
+QUEUE_TYPES = ['voice', 'chat', 'chat', 'social', 'mixed']
+STRATEGIES = ['round_robin', 'least_busy', 'skill_based', 'priority', 'random', 'scored']
+
+BATCH_SIZE = 1000
+
+
+def scaled_volumes(scale=1.0, **overrides):
+    """Return DEFAULT_VOLUMES multiplied by scale, with explicit overrides"""
+    volumes = {key: max(1, int(value * scale)) for key, value in DEFAULT_VOLUMES.items()}
+    volumes.update({key: value for key, value in overrides.items() if value is not None})
+    return volumes
+
+
+def seed(env, volumes, rng_seed=42):
+    """Populate the database with the given volumes, return the created counts"""
+    rng = random.Random(rng_seed)
+    cr = env.cr
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None, microsecond=0)
+
+    skills = env['cc.skill'].create([{
+        'name': f'Bench Skill {i}',
+        'code': f'BENCH_SK_{i}',
+        'skill_type': rng.choice(['language', 'product', 'technical', 'soft', 'channel']),
+    } for i in range(volumes['skills'])])
+
+    teams = env['cc.team'].create([{
+        'name': f'Bench Team {i}',
+        'code': f'BENCH_TM_{i}',
+    } for i in range(volumes['teams'])])
+
+    agent_ids = []
+    for start in range(0, volumes['agents'], BATCH_SIZE):
+        count = min(BATCH_SIZE, volumes['agents'] - start)
+        agents = env['cc.agent'].create([{
+            'name': f'Bench Agent {start + i}',
+            'agent_code': f'BENCH_AG_{start + i}',
+            'team_id': rng.choice(teams).id,
+            'skill_ids': [(6, 0, rng.sample(skills.ids, min(len(skills), rng.randint(3, 12))))],
+            'status': rng.choice(AGENT_STATUSES),
+            'can_voice': rng.random() < 0.8,
+            'can_chat': rng.random() < 0.8,
+            'can_social': rng.random() < 0.4,
+            'max_concurrent_chats': rng.randint(2, 5),
+            'avg_rating': round(rng.uniform(2.5, 5.0), 2),
+            'avg_handle_time': round(rng.uniform(2.0, 15.0), 2),
+            'last_call_time': False if rng.random() < 0.1 else now - datetime.timedelta(seconds=rng.randint(0, 7200)),
+        } for i in range(count)])
+        agent_ids += agents.ids
+        env.flush_all()
+        env.invalidate_all()
+
+    queues = env['cc.queue'].create([{
+        'name': f'Bench Queue {i}',
+        'code': f'BENCH_Q_{i}',
+        'queue_type': rng.choice(QUEUE_TYPES),
+        'routing_strategy': rng.choice(STRATEGIES),
+        'priority': rng.randint(1, 20),
+        'team_ids': [(6, 0, rng.sample(teams.ids, min(len(teams), rng.randint(1, 4))))],
+        'required_skill_ids': [(6, 0, rng.sample(skills.ids, min(len(skills), rng.randint(0, 2))))],
+    } for i in range(volumes['queues'])])
+    env.flush_all()
+
+    # cc.call history
+    cr.execute("""
+        INSERT INTO cc_call (
+            name, interaction_type, channel, status, agent_id, queue_id,
+            caller_number, start_time, answer_time, end_time,
+            wait_duration, talk_duration, total_duration, hold_duration,
+            create_date, write_date
+        )
+        SELECT 'BENCH/' || g,
+               (ARRAY['inbound', 'outbound'])[1 + (g %% 2)],
+               (ARRAY['voice', 'chat', 'email', 'whatsapp', 'messenger', 'instagram', 'telegram'])[1 + (g %% 7)],
+               (ARRAY['completed', 'completed', 'completed', 'missed', 'abandoned', 'transferred'])[1 + (g %% 6)],
+               (%(agent_ids)s::int[])[1 + (g %% %(agent_count)s)],
+               (%(queue_ids)s::int[])[1 + (g %% %(queue_count)s)],
+               '+2010' || lpad((g %% 10000000)::text, 8, '0'),
+               t.start_time,
+               t.start_time + interval '20 seconds',
+               t.start_time + interval '320 seconds',
+               20, 300, 320, 0,
+               t.start_time, t.start_time
+          FROM generate_series(1, %(count)s) AS g
+         CROSS JOIN LATERAL (
+                SELECT (now() AT TIME ZONE 'UTC') - (g * interval '15 seconds') AS start_time
+         ) t
+    """, {
+        'agent_ids': agent_ids,
+        'agent_count': len(agent_ids),
+        'queue_ids': queues.ids,
+        'queue_count': len(queues),
+        'count': volumes['calls'],
+    })
+
+    # Shadow profiles and their conversations
+    cr.execute("""
+        INSERT INTO shadow_profile (
+            name, whatsapp_id, status, source_channel, message_count,
+            is_converted, language, first_contact_date, last_contact_date,
+            create_date, write_date
+        )
+        SELECT 'Bench Contact ' || g,
+               'bench_wa_' || g,
+               (ARRAY['anonymous', 'qualified', 'pending_registration', 'registered'])[1 + (g %% 4)],
+               (ARRAY['whatsapp', 'facebook', 'instagram', 'telegram', 'website', 'phone'])[1 + (g %% 6)],
+               0, false, 'ar',
+               (now() AT TIME ZONE 'UTC') - (g * interval '1 minute'),
+               (now() AT TIME ZONE 'UTC') - (g * interval '30 seconds'),
+               now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+          FROM generate_series(1, %(count)s) AS g
+        RETURNING id
+    """, {'count': volumes['profiles']})
+    profile_ids = [row[0] for row in cr.fetchall()]
+
+    cr.execute("""
+        INSERT INTO shadow_conversation (
+            shadow_profile_id, channel, message, direction, timestamp,
+            is_ai_response, create_date, write_date
+        )
+        SELECT (%(profile_ids)s::int[])[1 + (g %% %(profile_count)s)],
+               (ARRAY['whatsapp', 'messenger', 'instagram', 'telegram', 'website', 'phone'])[1 + (g %% 6)],
+               'Benchmark message ' || g,
+               (ARRAY['incoming', 'outgoing'])[1 + (g %% 2)],
+               (now() AT TIME ZONE 'UTC') - (g * interval '1 second'),
+               (g %% 3 = 0),
+               now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+          FROM generate_series(1, %(count)s) AS g
+    """, {
+        'profile_ids': profile_ids,
+        'profile_count': len(profile_ids),
+        'count': volumes['conversations'],
+    })
+    cr.execute("""
+        UPDATE shadow_profile p
+           SET message_count = c.total
+          FROM (SELECT shadow_profile_id, count(*) AS total
+                  FROM shadow_conversation
+                 WHERE shadow_profile_id = ANY(%s)
+                 GROUP BY shadow_profile_id) c
+         WHERE p.id = c.shadow_profile_id
+    """, [profile_ids])
+
+    # Calls and profiles were inserted in SQL, bypassing the live counter,
+    # metric and identity hooks
+    env['cc.live.counter']._reconcile(['call'])
+    env['cc.call']._backfill_metrics()
+    env['shadow.profile.identity']._backfill()
+
+    for table in ('cc_agent', 'cc_queue', 'cc_queue_agent_eligibility', 'cc_call',
+                  'shadow_profile', 'shadow_conversation', 'shadow_profile_identity'):
+        cr.execute(f'ANALYZE {table}')
+
+    return {
+        'skills': len(skills),
+        'teams': len(teams),
+        'agents': len(agent_ids),
+        'queues': len(queues),
+        'calls': volumes['calls'],
+        'profiles': len(profile_ids),
+        'conversations': volumes['conversations'],
+    }
@@ -0,0 +1,301 @@
+"""Routing and API benchmark runner.
+
+Boots an Odoo registry on a dedicated database, optionally seeds it with
+synthetic data (see datagen.py), times the routing methods in process and the
+REST endpoints over HTTP, and writes a JSON report that can be compared
+across commits::
+
+    python benchmarks/run.py -c odoo.conf -d cc_bench --seed --scale 0.1
+    python benchmarks/run.py -c odoo.conf -d cc_bench --url http://localhost:8069 \\
+        --api-key KEY --output bench-$(git rev-parse --short HEAD).json
+    python benchmarks/run.py --compare before.json after.json
+
+The report also records the plans of the keyset pagination queries, which
+must be index scans without a Sort node (see keyset_plans).
+
+The database must have omni_contact_center installed. Never point this at a
+production database: seeding writes millions of rows.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import datagen
+
+
+def percentiles(samples):
+    """Return p50/p95/p99 of the samples (seconds) in milliseconds"""
+    if len(samples) < 2:
+        value = samples[0] * 1000 if samples else 0.0
+        return value, value, value
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return cuts[49] * 1000, cuts[94] * 1000, cuts[98] * 1000
+
+
+def summarize(samples, queries, iterations, elapsed):
+    p50, p95, p99 = percentiles(samples)
+    return {
+        'iterations': iterations,
+        'p50_ms': round(p50, 3),
+        'p95_ms': round(p95, 3),
+        'p99_ms': round(p99, 3),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3) if samples else 0.0,
+        'throughput_per_s': round(iterations / elapsed, 2) if elapsed else 0.0,
+        'queries_per_call': round(queries / iterations, 2) if queries is not None and iterations else None,
+    }
+
+
+def bench_in_process(env, name, func, iterations, rollback=False):
+    """Time func() iterations times, counting SQL queries on env.cr"""
+    cr = env.cr
+    samples = []
+    queries = 0
+    started = time.perf_counter()
+    for i in range(iterations):
+        before = cr.sql_log_count
+        start = time.perf_counter()
+        if rollback:
+            with cr.savepoint(flush=False) as savepoint:
+                func(i)
+                env.flush_all()
+                savepoint.rollback()
+            env.invalidate_all()
+        else:
+            func(i)
+        samples.append(time.perf_counter() - start)
+        queries += cr.sql_log_count - before
+    result = summarize(samples, queries, iterations, time.perf_counter() - started)
+    print(f'{name:40s} p50={result["p50_ms"]:9.3f}ms p95={result["p95_ms"]:9.3f}ms '
+          f'p99={result["p99_ms"]:9.3f}ms q/call={result["queries_per_call"]}')
+    return result
+
+
+def bench_http(session, name, method, url, iterations, payload=None):
+    """Time an HTTP endpoint (query counts are not observable from the client)"""
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        if method == 'GET':
+            response = session.get(url, timeout=300)
+        else:
+            response = session.post(url, json=payload, timeout=300)
+        response.raise_for_status()
+        samples.append(time.perf_counter() - start)
+    result = summarize(samples, None, iterations, time.perf_counter() - started)
+    print(f'{name:40s} p50={result["p50_ms"]:9.3f}ms p95={result["p95_ms"]:9.3f}ms '
+          f'p99={result["p99_ms"]:9.3f}ms')
+    return result
+
+
+def run_in_process(env, iterations):
+    Queue = env['cc.queue']
+    Agent = env['cc.agent']
+    queues = Queue.search([('code', '=like', 'BENCH_Q_%')]) or Queue.search([])
+    skill_codes = env['cc.skill'].search([]).mapped('code') or [None]
+    channels = ['voice', 'chat', 'email', 'social', None]
+    results = {}
+
+    def pick(i):
+        return queues[i % len(queues)]
+
+    results['cc.queue.route_to_agent'] = bench_in_process(
+        env, 'cc.queue.route_to_agent', lambda i: pick(i).route_to_agent(), iterations)
+    results['cc.queue.get_available_agents'] = bench_in_process(
+        env, 'cc.queue.get_available_agents', lambda i: pick(i).get_available_agents(), iterations)
+    results['cc.agent.get_available_agents'] = bench_in_process(
+        env, 'cc.agent.get_available_agents',
+        lambda i: Agent.get_available_agents(
+            skill_code=skill_codes[i % len(skill_codes)],
+            channel=channels[i % len(channels)],
+        ), iterations)
+
+    def route(i):
+        # Same work as POST /api/v1/cc/route, rolled back after each iteration
+        queue = pick(i)
+        agent = queue.claim_agent('voice')
+        env['cc.call'].create({
+            'queue_id': queue.id,
+            'agent_id': agent.id if agent else False,
+            'channel': 'voice',
+            'status': 'ringing' if agent else 'queued',
+        })
+        if agent:
+            agent.to_dict()
+
+    results['route_interaction (in process)'] = bench_in_process(
+        env, 'route_interaction (in process)', route, iterations, rollback=True)
+    return results
+
+
+def run_http(url, api_key, iterations, include_route):
+    import requests
+
+    session = requests.Session()
+    session.headers['Authorization'] = f'Bearer {api_key}'
+    endpoints = [
+        ('GET /api/v1/cc/stats', 'GET', '/api/v1/cc/stats'),
+        ('GET /api/v1/cc/agents', 'GET', '/api/v1/cc/agents?limit=100'),
+        ('GET /api/v1/cc/agents/available', 'GET', '/api/v1/cc/agents/available?channel=chat'),
+        ('GET /api/v1/cc/calls', 'GET', '/api/v1/cc/calls?limit=100'),
+        ('GET /api/v1/cc/calls (deep page)', 'GET', '/api/v1/cc/calls?limit=100&offset=100000'),
+        ('GET /api/v1/cc/queues', 'GET', '/api/v1/cc/queues'),
+        ('GET /api/v1/shadow', 'GET', '/api/v1/shadow?limit=100'),
+        ('GET /api/v1/shadow/stats', 'GET', '/api/v1/shadow/stats'),
+        ('GET /api/v1/shadow/search', 'GET', '/api/v1/shadow/search?identifier=bench_wa_1000'),
+    ]
+    results = {}
+    for name, method, path in endpoints:
+        results[name] = bench_http(session, name, method, url + path, iterations)
+    if include_route:
+        # Mutating: creates calls and changes agent statuses
+        results['POST /api/v1/cc/route'] = bench_http(
+            session, 'POST /api/v1/cc/route', 'POST', url + '/api/v1/cc/route', iterations,
+            payload={'jsonrpc': '2.0', 'params': {}, 'queue_code': 'BENCH_Q_0', 'channel': 'chat'})
+    return results
+
+
+# Keyset paginated models and the domain of their API pages
+KEYSET_PAGES = [
+    ('cc.call', lambda env: []),
+    ('shadow.profile', lambda env: []),
+    # /api/v1/shadow/<id>/conversations pages one profile's history
+    ('shadow.conversation', lambda env: [
+        ('shadow_profile_id', '=', env['shadow.conversation'].search([], limit=1).shadow_profile_id.id),
+    ]),
+]
+
+
+def plan_nodes(plan):
+    """Yield the node types of an EXPLAIN (FORMAT JSON) plan, depth first"""
+    yield plan['Node Type']
+    for child in plan.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+def keyset_plans(env, limit=100):
+    """EXPLAIN the first page queries of every keyset paginated model, both directions
+
+    Each query must be an index scan with no Sort node: a sort means the page
+    order does not match the keyset index and every matching row is read.
+    """
+    from odoo.tools import SQL
+
+    plans = {}
+    for model, domain in KEYSET_PAGES:
+        Model = env[model]
+        for reverse in (False, True):
+            for index, (condition, order) in enumerate(Model._api_page_segments(reverse=reverse)):
+                query = Model._search(domain(env), limit=limit, order=order)
+                query.add_where(condition)
+                env.cr.execute(SQL("EXPLAIN (FORMAT JSON) %s", query.select()))
+                nodes = list(plan_nodes(env.cr.fetchone()[0][0]['Plan']))
+                name = f'{model} {"reverse" if reverse else "forward"} segment {index}'
+                has_sort = any('Sort' in node for node in nodes)
+                plans[name] = {'nodes': nodes, 'sorted': has_sort}
+                print(f'{name:50s} {"SORT" if has_sort else "ok":4s} {" > ".join(nodes)}')
+    return plans
+
+
+def table_counts(env):
+    counts = {}
+    for model in ('cc.skill', 'cc.team', 'cc.agent', 'cc.queue', 'cc.call',
+                  'shadow.profile', 'shadow.conversation'):
+        env.cr.execute(f'SELECT count(*) FROM {env[model]._table}')
+        counts[model] = env.cr.fetchone()[0]
+    return counts
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)['results']
+    with open(after_path) as f:
+        after = json.load(f)['results']
+    print(f'{"benchmark":40s} {"p50 before":>12s} {"p50 after":>12s} {"change":>8s}')
+    for name in sorted(set(before) & set(after)):
+        old, new = before[name]['p50_ms'], after[name]['p50_ms']
+        change = f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+        print(f'{name:40s} {old:12.3f} {new:12.3f} {change:>8s}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-c', '--config', help='Odoo configuration file')
+    parser.add_argument('-d', '--database', help='Benchmark database (must have omni_contact_center installed)')
+    parser.add_argument('--seed', action='store_true', help='Generate synthetic data before running')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplier applied to the default volumes')
+    for key in datagen.DEFAULT_VOLUMES:
+        parser.add_argument(f'--{key}', type=int, help=f'Number of {key} to generate (overrides --scale)')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--url', help='Base URL of a running Odoo server for the HTTP benchmarks')
+    parser.add_argument('--api-key', help='API key for the HTTP benchmarks')
+    parser.add_argument('--include-route-endpoint', action='store_true',
+                        help='Also benchmark POST /api/v1/cc/route over HTTP (mutates data)')
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='Compare two reports instead of running')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+    if not args.database:
+        parser.error('--database is required')
+
+    import odoo
+    from odoo.tools import config
+
+    config.parse_config((['-c', args.config] if args.config else []) + ['-d', args.database])
+    registry = odoo.modules.registry.Registry(args.database)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'database': args.database,
+            'iterations': args.iterations,
+        },
+        'results': {},
+    }
+
+    if args.seed:
+        volumes = datagen.scaled_volumes(args.scale, **{key: getattr(args, key) for key in datagen.DEFAULT_VOLUMES})
+        print(f'Seeding {volumes}')
+        with registry.cursor() as cr:
+            env = odoo.api.Environment(cr, odoo.SUPERUSER_ID, {})
+            report['meta']['seeded'] = datagen.seed(env, volumes)
+
+    with registry.cursor() as cr:
+        env = odoo.api.Environment(cr, odoo.SUPERUSER_ID, {})
+        report['meta']['volumes'] = table_counts(env)
+        report['meta']['keyset_plans'] = keyset_plans(env)
+        report['results'].update(run_in_process(env, args.iterations))
+        cr.rollback()
+
+    if args.url:
+        if not args.api_key:
+            parser.error('--api-key is required with --url')
+        report['results'].update(run_http(args.url.rstrip('/'), args.api_key, args.iterations,
+                                          args.include_route_endpoint))
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Report written to {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
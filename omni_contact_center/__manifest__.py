@@ -34,9 +34,13 @@
     'author': 'Omnichannel Team',
     'website': 'https://github.com/swntqtest/omnichannel-odoo-modules',
     'depends': ['base', 'hr', 'shadow_profiles'],
+    'external_dependencies': {
+        'python': ['numpy'],
+    },
     'data': [
         'security/ir.model.access.csv',
         'data/cc_sequence.xml',
+        'data/cc_cron.xml',
         'views/cc_agent_views.xml',
         'views/cc_queue_views.xml',
         'views/cc_team_views.xml',
@@ -1,6 +1,13 @@
 import json
+
 from odoo import http
 from odoo.http import request, Response
+from odoo.addons.shadow_profiles.tools.api_errors import CONCURRENCY_ERRORS
+from odoo.addons.shadow_profiles.tools.api_params import add_total, parse_datetimes, serialize_options
+from odoo.addons.shadow_profiles.tools.export_stream import EXPORT_FORMATS, stream_export
+from odoo.addons.shadow_profiles.tools.response_cache import get_cached, put_cached, response_etag
+
+from ..tools.route_trace import get_traces, start_trace
 
 
 class ContactCenterAPI(http.Controller):
@@ -30,6 +37,30 @@ class ContactCenterAPI(http.Controller):
             response['message'] = message
         return self._json_response(response)
 
+    def _versioned_response(self, Model, kwargs, build):
+        """Serve rarely changing data with a strong ETag and an in-process body cache
+
+        The cache key holds the payload version of ``Model``: a matching
+        If-None-Match gets a 304 and a cache hit is served without loading any
+        record, ``build()`` only runs on a miss.
+        """
+        version = Model._api_version(expand=serialize_options(kwargs).get('expand'))
+        key = (
+            request.env.cr.dbname, request.httprequest.path,
+            tuple(sorted(kwargs.items())), version,
+        )
+        etag = response_etag(key)
+        if request.httprequest.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            body = get_cached(key)
+            if body is None:
+                body = json.dumps({'success': True, 'data': build()}, default=str)
+                put_cached(key, body)
+            response = Response(body, status=200, mimetype='application/json')
+        response.set_etag(etag)
+        return response
+
     # ============== AGENT ENDPOINTS ==============
 
     @http.route('/api/v1/cc/agents', type='http', auth='api_key', methods=['GET'], csrf=False)
@@ -48,17 +79,18 @@ class ContactCenterAPI(http.Controller):
             limit = int(kwargs.get('limit', 100))
             offset = int(kwargs.get('offset', 0))
 
-            agents = request.env['cc.agent'].sudo().search(
-                domain, limit=limit, offset=offset, order='name'
-            )
-            total = request.env['cc.agent'].sudo().search_count(domain)
+            Agent = request.env['cc.agent'].sudo()
+            agents = Agent.search(domain, limit=limit, offset=offset, order='name')
 
-            return self._success_response({
-                'records': [a.to_dict() for a in agents],
-                'total': total,
+            result = {
+                'records': agents.to_dicts(**serialize_options(kwargs)),
                 'limit': limit,
                 'offset': offset
-            })
+            }
+            add_total(result, Agent, domain, kwargs)
+            return self._success_response(result)
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return self._error_response(str(e), 500)
 
@@ -77,9 +109,11 @@ class ContactCenterAPI(http.Controller):
             )
 
             return self._success_response({
-                'records': [a.to_dict() for a in agents],
+                'records': agents.to_dicts(**serialize_options(kwargs)),
                 'count': len(agents)
             })
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return self._error_response(str(e), 500)
 
@@ -90,7 +124,9 @@ class ContactCenterAPI(http.Controller):
             agent = request.env['cc.agent'].sudo().browse(agent_id)
             if not agent.exists():
                 return self._error_response('Agent not found', 404)
-            return self._success_response(agent.to_dict())
+            return self._success_response(agent.to_dict(**serialize_options(kwargs)))
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return self._error_response(str(e), 500)
 
@@ -119,6 +155,8 @@ class ContactCenterAPI(http.Controller):
                 return {'success': False, 'error': 'Invalid status'}
 
             return {'success': True, 'data': agent.to_dict()}
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
@@ -133,11 +171,14 @@ class ContactCenterAPI(http.Controller):
             if kwargs.get('queue_type'):
                 domain.append(('queue_type', '=', kwargs['queue_type']))
 
-            queues = request.env['cc.queue'].sudo().search(domain, order='priority desc, name')
-
-            return self._success_response({
-                'records': [q.to_dict() for q in queues]
+            Queue = request.env['cc.queue'].sudo()
+            return self._versioned_response(Queue, kwargs, lambda: {
+                'records': Queue.search(domain, order='priority desc, name').to_dicts(
+                    **serialize_options(kwargs)
+                )
             })
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return self._error_response(str(e), 500)
 
@@ -149,11 +190,16 @@ class ContactCenterAPI(http.Controller):
             if not queue.exists():
                 return self._error_response('Queue not found', 404)
 
-            data = queue.to_dict()
-            data['available_agents_list'] = [
-                a.to_dict() for a in queue.get_available_agents()
-            ]
+            options = serialize_options(kwargs)
+            data = queue.to_dict(**options)
+            if 'fields' not in options or 'available_agents_list' in options['fields']:
+                agents = queue.get_available_agents()
+                if 'available_agents' in data:
+                    data['available_agents'] = len(agents)
+                data['available_agents_list'] = agents.to_dicts()
             return self._success_response(data)
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return self._error_response(str(e), 500)
 
@@ -172,67 +218,109 @@ class ContactCenterAPI(http.Controller):
             interaction_type = data.get('interaction_type', 'inbound')
             shadow_profile_id = data.get('shadow_profile_id')
 
-            Queue = request.env['cc.queue'].sudo()
-            if queue_id:
-                queue = Queue.browse(int(queue_id))
-            elif queue_code:
-                queue = Queue.search([('code', '=', queue_code)], limit=1)
-            else:
-                return {'success': False, 'error': 'queue_code or queue_id required'}
+            Call = request.env['cc.call'].sudo()
+            # Validate before any agent capacity is reserved
+            Call._check_interaction(channel, interaction_type)
 
-            if not queue.exists():
-                return {'success': False, 'error': 'Queue not found'}
+            tracer = start_trace(request.env, force=bool(data.get('trace')), channel=channel)
+
+            Queue = request.env['cc.queue'].sudo()
+            with tracer.stage('queue_resolution'):
+                if queue_id:
+                    queue = Queue.browse(int(queue_id))
+                elif queue_code:
+                    queue = Queue.search([('code', '=', queue_code)], limit=1)
+                else:
+                    return {'success': False, 'error': 'queue_code or queue_id required'}
+
+                if not queue.exists():
+                    return {'success': False, 'error': 'Queue not found'}
+            tracer.set(queue_id=queue.id, routing_strategy=queue.routing_strategy)
+
+            # Reserve the best agent and create the call (queued when no agent
+            # is available): a failed create also rolls the reservation back
+            with request.env.cr.savepoint():
+                agent = queue.claim_agent(channel, tracer=tracer)
+                with tracer.stage('call_creation'):
+                    call = Call.create({
+                        'queue_id': queue.id,
+                        'agent_id': agent.id if agent else False,
+                        'channel': channel,
+                        'interaction_type': interaction_type,
+                        'caller_number': caller_number,
+                        'caller_name': caller_name,
+                        'shadow_profile_id': shadow_profile_id,
+                        'status': 'ringing' if agent else 'queued',
+                    })
 
-            # Find best agent
-            agent = queue.route_to_agent()
             if not agent:
-                # No agent available - queue the call
-                call = request.env['cc.call'].sudo().create({
-                    'queue_id': queue.id,
-                    'channel': channel,
-                    'interaction_type': interaction_type,
-                    'caller_number': caller_number,
-                    'caller_name': caller_name,
-                    'shadow_profile_id': shadow_profile_id,
-                    'status': 'queued',
-                })
-                queue.calls_waiting += 1
-                return {
+                tracer.finish(routed=False, call_id=call.id)
+                result = {
                     'success': True,
                     'routed': False,
                     'queued': True,
                     'call_id': call.id,
                     'message': 'No agents available, call queued'
                 }
+                if tracer.enabled:
+                    result['trace_id'] = tracer.id
+                return result
 
-            # Create call record
-            call = request.env['cc.call'].sudo().create({
-                'queue_id': queue.id,
-                'agent_id': agent.id,
-                'channel': channel,
-                'interaction_type': interaction_type,
-                'caller_number': caller_number,
-                'caller_name': caller_name,
-                'shadow_profile_id': shadow_profile_id,
-                'status': 'ringing',
-            })
+            with tracer.stage('serialization'):
+                agent_data = agent.to_dict()
+            tracer.finish(routed=True, agent_id=agent.id, call_id=call.id)
 
-            # Update agent status
-            if channel == 'chat':
-                agent.increment_chat_count()
-            else:
-                agent.action_set_busy()
-
-            return {
+            result = {
                 'success': True,
                 'routed': True,
                 'queued': False,
                 'call_id': call.id,
-                'agent': agent.to_dict()
+                'agent': agent_data
+            }
+            if tracer.enabled:
+                result['trace_id'] = tracer.id
+            return result
+        except CONCURRENCY_ERRORS:
+            raise
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    @http.route('/api/v1/cc/route/batch', type='json', auth='api_key', methods=['POST'], csrf=False)
+    def route_interactions_batch(self, **kwargs):
+        """Route a batch of interactions, results are returned in input order"""
+        try:
+            data = request.jsonrequest
+            interactions = data.get('interactions')
+            if not interactions or not isinstance(interactions, list):
+                return {'success': False, 'error': 'interactions list required'}
+
+            # A failure after agents were reserved rolls the whole batch back
+            with request.env.cr.savepoint():
+                results = request.env['cc.queue'].sudo().route_interactions(interactions)
+            return {
+                'success': True,
+                'results': results,
             }
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
+    @http.route('/api/v1/cc/route/traces', type='http', auth='api_key', methods=['GET'], csrf=False)
+    def list_route_traces(self, **kwargs):
+        """List sampled routing traces of this worker, newest first"""
+        try:
+            limit = int(kwargs.get('limit', 50))
+            traces = get_traces(limit)
+            return self._success_response({
+                'records': traces,
+                'total': len(traces),
+            })
+        except CONCURRENCY_ERRORS:
+            raise
+        except Exception as e:
+            return self._error_response(str(e), 500)
+
     # ============== CALL ENDPOINTS ==============
 
     @http.route('/api/v1/cc/calls', type='http', auth='api_key', methods=['GET'], csrf=False)
@@ -250,20 +338,57 @@ class ContactCenterAPI(http.Controller):
             if kwargs.get('channel'):
                 domain.append(('channel', '=', kwargs['channel']))
 
+            Call = request.env['cc.call'].sudo()
             limit = int(kwargs.get('limit', 100))
-            offset = int(kwargs.get('offset', 0))
+            result = {'limit': limit}
 
-            calls = request.env['cc.call'].sudo().search(
-                domain, limit=limit, offset=offset, order='start_time desc'
-            )
-            total = request.env['cc.call'].sudo().search_count(domain)
+            if 'offset' in kwargs:
+                # Legacy offset paging, counted unless count=none
+                offset = int(kwargs['offset'])
+                calls = Call.search(domain, limit=limit, offset=offset, order='start_time desc')
+                result['offset'] = offset
+            else:
+                calls, result['next_cursor'] = Call._api_search_page(
+                    domain, cursor=kwargs.get('cursor'), limit=limit
+                )
+
+            result['records'] = calls.to_dicts(**serialize_options(kwargs))
+            add_total(result, Call, domain, kwargs, 'exact' if 'offset' in kwargs else 'none')
+            return self._success_response(result)
+        except CONCURRENCY_ERRORS:
+            raise
+        except Exception as e:
+            return self._error_response(str(e), 500)
 
-            return self._success_response({
-                'records': [c.to_dict() for c in calls],
-                'total': total,
-                'limit': limit,
-                'offset': offset
-            })
+    @http.route('/api/v1/cc/calls/export', type='http', auth='api_key', methods=['GET'], csrf=False)
+    def export_calls(self, **kwargs):
+        """Stream the call history as NDJSON (default) or CSV"""
+        try:
+            fmt = kwargs.get('format', 'ndjson')
+            if fmt not in EXPORT_FORMATS:
+                return self._error_response('format must be ndjson or csv')
+            try:
+                dates = parse_datetimes(kwargs, 'date_from', 'date_to')
+            except ValueError as e:
+                return self._error_response(str(e))
+
+            columns, query = request.env['cc.call'].sudo()._export_query(
+                date_from=dates.get('date_from'),
+                date_to=dates.get('date_to'),
+                queue_id=kwargs.get('queue_id'),
+                agent_id=kwargs.get('agent_id'),
+                channel=kwargs.get('channel'),
+                status=kwargs.get('status'),
+            )
+            mimetype, extension = EXPORT_FORMATS[fmt]
+            return Response(
+                stream_export(request.env.registry, query, columns, fmt),
+                mimetype=mimetype,
+                headers=[('Content-Disposition', f'attachment; filename=calls.{extension}')],
+                direct_passthrough=True,
+            )
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return self._error_response(str(e), 500)
 
@@ -274,7 +399,9 @@ class ContactCenterAPI(http.Controller):
             call = request.env['cc.call'].sudo().browse(call_id)
             if not call.exists():
                 return self._error_response('Call not found', 404)
-            return self._success_response(call.to_dict())
+            return self._success_response(call.to_dict(**serialize_options(kwargs)))
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return self._error_response(str(e), 500)
 
@@ -287,10 +414,10 @@ class ContactCenterAPI(http.Controller):
                 return {'success': False, 'error': 'Call not found'}
 
             call.action_answer()
-            if call.queue_id and call.queue_id.calls_waiting > 0:
-                call.queue_id.calls_waiting -= 1
 
             return {'success': True, 'data': call.to_dict()}
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
@@ -317,6 +444,23 @@ class ContactCenterAPI(http.Controller):
                 call.agent_id.decrement_chat_count()
 
             return {'success': True, 'data': call.to_dict()}
+        except CONCURRENCY_ERRORS:
+            raise
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    @http.route('/api/v1/cc/calls/<int:call_id>/abandon', type='json', auth='api_key', methods=['POST'], csrf=False)
+    def abandon_call(self, call_id, **kwargs):
+        """Mark a queued or ringing call as abandoned by the caller"""
+        try:
+            call = request.env['cc.call'].sudo().browse(call_id)
+            if not call.exists():
+                return {'success': False, 'error': 'Call not found'}
+
+            call.action_abandon()
+            return {'success': True, 'data': call.to_dict()}
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
@@ -341,6 +485,8 @@ class ContactCenterAPI(http.Controller):
                     'new_call': new_call.to_dict() if new_call else None
                 }
             }
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
@@ -350,10 +496,14 @@ class ContactCenterAPI(http.Controller):
     def list_teams(self, **kwargs):
         """List all teams"""
         try:
-            teams = request.env['cc.team'].sudo().search([('active', '=', True)])
-            return self._success_response({
-                'records': [t.to_dict() for t in teams]
+            Team = request.env['cc.team'].sudo()
+            return self._versioned_response(Team, kwargs, lambda: {
+                'records': Team.search([('active', '=', True)]).to_dicts(
+                    **serialize_options(kwargs)
+                )
             })
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return self._error_response(str(e), 500)
 
@@ -365,9 +515,13 @@ class ContactCenterAPI(http.Controller):
             if not team.exists():
                 return self._error_response('Team not found', 404)
 
-            data = team.to_dict()
-            data['agents'] = [a.to_dict() for a in team.agent_ids]
+            options = serialize_options(kwargs)
+            data = team.to_dict(**options)
+            if 'fields' not in options or 'agents' in options['fields']:
+                data['agents'] = team.agent_ids.to_dicts()
             return self._success_response(data)
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return self._error_response(str(e), 500)
 
@@ -377,10 +531,14 @@ class ContactCenterAPI(http.Controller):
     def list_skills(self, **kwargs):
         """List all skills"""
         try:
-            skills = request.env['cc.skill'].sudo().search([('active', '=', True)])
-            return self._success_response({
-                'records': [s.to_dict() for s in skills]
+            Skill = request.env['cc.skill'].sudo()
+            return self._versioned_response(Skill, kwargs, lambda: {
+                'records': Skill.search([('active', '=', True)]).to_dicts(
+                    **serialize_options(kwargs)
+                )
             })
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return self._error_response(str(e), 500)
 
@@ -399,11 +557,14 @@ class ContactCenterAPI(http.Controller):
             if kwargs.get('status'):
                 domain.append(('status', '=', kwargs['status']))
 
-            shifts = request.env['cc.shift'].sudo().search(domain, order='date desc, start_time')
-
-            return self._success_response({
-                'records': [s.to_dict() for s in shifts]
+            Shift = request.env['cc.shift'].sudo()
+            return self._versioned_response(Shift, kwargs, lambda: {
+                'records': Shift.search(domain, order='date desc, start_time').to_dicts(
+                    **serialize_options(kwargs)
+                )
             })
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return self._error_response(str(e), 500)
 
@@ -417,6 +578,8 @@ class ContactCenterAPI(http.Controller):
 
             shift.action_start_shift()
             return {'success': True, 'data': shift.to_dict()}
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
@@ -430,6 +593,8 @@ class ContactCenterAPI(http.Controller):
 
             shift.action_end_shift()
             return {'success': True, 'data': shift.to_dict()}
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
@@ -439,31 +604,27 @@ class ContactCenterAPI(http.Controller):
     def get_stats(self, **kwargs):
         """Get contact center statistics"""
         try:
-            Agent = request.env['cc.agent'].sudo()
-            Call = request.env['cc.call'].sudo()
-            Queue = request.env['cc.queue'].sudo()
-
             stats = {
-                'agents': {
-                    'total': Agent.search_count([('active', '=', True)]),
-                    'available': Agent.search_count([('status', '=', 'available')]),
-                    'busy': Agent.search_count([('status', '=', 'busy')]),
-                    'on_break': Agent.search_count([('status', '=', 'on_break')]),
-                    'offline': Agent.search_count([('status', '=', 'offline')]),
-                },
-                'calls': {
-                    'queued': Call.search_count([('status', '=', 'queued')]),
-                    'in_progress': Call.search_count([('status', '=', 'in_progress')]),
-                    'completed_today': Call.search_count([
-                        ('status', '=', 'completed'),
-                        ('end_time', '>=', kwargs.get('date', False) or False)
-                    ]) if kwargs.get('date') else 0,
-                },
-                'queues': {
-                    'total': Queue.search_count([('active', '=', True)]),
-                    'total_waiting': sum(Queue.search([('active', '=', True)]).mapped('calls_waiting')),
-                }
+                'agents': request.env['cc.agent'].sudo().get_status_counts(),
+                'calls': request.env['cc.call'].sudo().get_stats(
+                    date_from=kwargs.get('date_from'),
+                    date_to=kwargs.get('date_to'),
+                    date=kwargs.get('date'),
+                ),
+                'queues': request.env['cc.queue'].sudo().get_waiting_totals(),
             }
             return self._success_response(stats)
+        except CONCURRENCY_ERRORS:
+            raise
+        except Exception as e:
+            return self._error_response(str(e), 500)
+
+    @http.route('/api/v1/cc/stats/live', type='http', auth='api_key', methods=['GET'], csrf=False)
+    def get_live_stats(self, **kwargs):
+        """Get live agent counts by team/status and call counts by queue/channel/status"""
+        try:
+            return self._success_response(request.env['cc.live.counter'].sudo().get_live())
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return self._error_response(str(e), 500)
@@ -4,3 +4,6 @@ from . import cc_agent
 from . import cc_queue
 from . import cc_shift
 from . import cc_call
+from . import hr_employee
+from . import cc_queue_agent_eligibility
+from . import cc_live_counter
@@ -1,8 +1,42 @@
+from collections import Counter
+
 from odoo import models, fields, api
+from odoo.tools.sql import create_index
+
+
+# Queue type / interaction channel -> agent capability flag
+CHANNEL_FIELD_MAP = {
+    'voice': 'can_voice',
+    'chat': 'can_chat',
+    'email': 'can_email',
+    'social': 'can_social',
+}
+
+# Fields that change which queues an agent is eligible for
+ELIGIBILITY_FIELDS = {'team_id', 'skill_ids', 'can_voice', 'can_chat', 'can_email', 'can_social', 'active'}
+
+# Sorted ids of the agent's active skills, kept in the skill_key int[] column
+SKILL_KEY_SQL = """
+    UPDATE cc_agent a
+       SET skill_key = COALESCE((
+            SELECT array_agg(r.skill_id ORDER BY r.skill_id)
+              FROM cc_agent_skill_rel r
+              JOIN cc_skill s ON s.id = r.skill_id AND s.active
+             WHERE r.agent_id = a.id
+       ), '{{}}')
+     {where}
+"""
+
+# Columns touched by the SQL chat counter updates
+CHAT_COUNT_FIELDS = ['current_chats', 'status', 'last_status_change', 'write_uid', 'write_date']
+
+# Fields that move an agent between live counters
+LIVE_COUNTER_FIELDS = {'status', 'team_id', 'active'}
 
 
 class CCAgent(models.Model):
     _name = 'cc.agent'
+    _inherit = ['omni.api.mixin']
     _description = 'Contact Center Agent'
     _inherits = {'hr.employee': 'employee_id'}
     _order = 'name'
@@ -90,12 +124,90 @@ class CCAgent(models.Model):
         ('extension_unique', 'unique(extension)', 'Extension number must be unique!'),
     ]
 
+    def init(self):
+        super().init()
+        # Skill set as an int array so skill matching is a single (GIN indexed)
+        # containment test: agent.skill_key @> queue.required_skill_key
+        self.env.cr.execute("""
+            ALTER TABLE cc_agent ADD COLUMN IF NOT EXISTS skill_key integer[] NOT NULL DEFAULT '{}'
+        """)
+        create_index(self.env.cr, 'cc_agent_skill_key_idx', 'cc_agent', ['skill_key'], method='gin')
+        self.env.cr.execute(SKILL_KEY_SQL.format(where=''))
+
+        # Sample counts behind the online avg_handle_time/avg_rating means,
+        # filled from the call history by cc.call
+        self.env.cr.execute("""
+            ALTER TABLE cc_agent
+                ADD COLUMN IF NOT EXISTS handle_samples integer NOT NULL DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS rating_samples integer NOT NULL DEFAULT 0
+        """)
+
+        # Routing strategy orderings over available agents (see cc.queue ROUTING_ORDER)
+        available = "status = 'available'"
+        create_index(self.env.cr, 'cc_agent_available_idle_idx', 'cc_agent',
+                     ['last_call_time ASC NULLS FIRST', 'id'], where=available)
+        create_index(self.env.cr, 'cc_agent_available_load_idx', 'cc_agent',
+                     ['current_chats', 'id'], where=available)
+        create_index(self.env.cr, 'cc_agent_available_skills_idx', 'cc_agent',
+                     ['cardinality(skill_key) DESC', 'id'], where=available)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        agents = super().create(vals_list)
+        agents._sync_skill_key()
+        self.env['cc.queue.agent.eligibility']._refresh(agent_ids=agents.ids)
+        self.env['cc.live.counter']._apply(agents._live_counter_keys())
+        return agents
+
+    def write(self, vals):
+        counted = LIVE_COUNTER_FIELDS.intersection(vals)
+        if counted:
+            before = self._live_counter_keys()
+        res = super().write(vals)
+        if counted:
+            self.env['cc.live.counter']._apply_transition(before, self._live_counter_keys())
+        if 'skill_ids' in vals:
+            self._sync_skill_key()
+        if ELIGIBILITY_FIELDS.intersection(vals):
+            self.env['cc.queue.agent.eligibility']._refresh(agent_ids=self.ids)
+        return res
+
+    def unlink(self):
+        before = self._live_counter_keys()
+        res = super().unlink()
+        self.env['cc.live.counter']._apply_transition(before, Counter())
+        return res
+
+    def _live_counter_keys(self):
+        """Counter of the live counter keys of these agents (active ones only)"""
+        return Counter(
+            ('agent', agent.team_id.id or 0, '', agent.status)
+            for agent in self.with_context(active_test=False) if agent.active
+        )
+
+    def _count_status_changes(self, rows):
+        """Update live counters from (team_id, old status, new status, active) rows"""
+        deltas = Counter()
+        for team_id, old_status, new_status, active in rows:
+            if active and old_status != new_status:
+                deltas['agent', team_id or 0, '', old_status] -= 1
+                deltas['agent', team_id or 0, '', new_status] += 1
+        self.env['cc.live.counter']._apply(deltas)
+
+    def _sync_skill_key(self):
+        """Recompute the skill_key array from the agent skills"""
+        if not self:
+            return
+        self.env.flush_all()
+        self.env.cr.execute(SKILL_KEY_SQL.format(where='WHERE a.id IN %s'), [tuple(self.ids)])
+
     def action_set_available(self):
         """Set agent status to available"""
         self.write({
             'status': 'available',
             'last_status_change': fields.Datetime.now()
         })
+        self._dispatch_waiting_calls()
 
     def action_set_busy(self):
         """Set agent status to busy"""
@@ -125,76 +237,238 @@ class CCAgent(models.Model):
             'last_status_change': fields.Datetime.now()
         })
 
+    @api.model
+    def get_status_counts(self):
+        """Count active agents per status from the live counters"""
+        counts = dict.fromkeys(['total', *self._fields['status'].get_values(self.env)], 0)
+        for (channel, status), count in self.env['cc.live.counter'].get_totals('agent').items():
+            counts['total'] += count
+            counts[status] += count
+        return counts
+
     @api.model
     def get_available_agents(self, skill_code=None, team_id=None, channel=None):
         """Get list of available agents, optionally filtered by skill, team, or channel"""
-        domain = [('status', '=', 'available')]
+        conditions = ["a.active", "a.status = 'available'"]
+        params = []
 
         if team_id:
-            domain.append(('team_id', '=', team_id))
-
-        if channel:
-            channel_field_map = {
-                'voice': 'can_voice',
-                'chat': 'can_chat',
-                'email': 'can_email',
-                'social': 'can_social',
-            }
-            if channel in channel_field_map:
-                domain.append((channel_field_map[channel], '=', True))
-                # For chat, also check capacity
-                if channel == 'chat':
-                    agents = self.search(domain)
-                    return agents.filtered(
-                        lambda a: a.current_chats < a.max_concurrent_chats
-                    )
-
-        agents = self.search(domain)
+            conditions.append("a.team_id = %s")
+            params.append(team_id)
+
+        if channel in CHANNEL_FIELD_MAP:
+            conditions.append(f"a.{CHANNEL_FIELD_MAP[channel]}")
+            # For chat, also check capacity
+            if channel == 'chat':
+                conditions.append("a.current_chats < a.max_concurrent_chats")
 
         if skill_code:
-            agents = agents.filtered(
-                lambda a: skill_code in a.skill_ids.mapped('code')
+            conditions.append("""
+                a.skill_key @> ARRAY[(SELECT id FROM cc_skill WHERE code = %s AND active)]
+            """)
+            params.append(skill_code)
+
+        self.env.flush_all()
+        self.env.cr.execute(f"""
+            SELECT a.id
+              FROM cc_agent a
+              JOIN hr_employee e ON e.id = a.employee_id
+             WHERE {' AND '.join(conditions)}
+             ORDER BY e.name, a.id
+        """, params)
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    def _dispatch_waiting_calls(self):
+        """Assign queued calls to agents that just gained capacity"""
+        Call = self.env['cc.call']
+        for agent in self:
+            while agent.status == 'available':
+                call = Call._pop_waiting_call(agent)
+                if not call:
+                    break
+                agent.reserve_for_channel(call.channel)
+                call.write({'agent_id': agent.id, 'status': 'ringing'})
+
+    def reserve_for_channel(self, channel):
+        """Take agent capacity for a new interaction on the given channel"""
+        if channel == 'chat':
+            self.increment_chat_count()
+        else:
+            self.action_set_busy()
+
+    @api.model
+    def _reserve_capacity(self, chats_by_agent, busy_agent_ids):
+        """Reserve capacity on many agents in one UPDATE
+
+        ``chats_by_agent`` maps agent ids to a number of new chats, agents in
+        ``busy_agent_ids`` took a non-chat interaction and become busy.
+        """
+        agent_ids = list(set(chats_by_agent) | set(busy_agent_ids))
+        if not agent_ids:
+            return
+        self.browse(agent_ids).flush_recordset()
+        self.env.cr.execute("""
+            WITH prev AS (
+                SELECT id, status FROM cc_agent WHERE id = ANY(%(ids)s) FOR UPDATE
             )
+            UPDATE cc_agent a
+               SET current_chats = a.current_chats + v.chats,
+                   status = CASE WHEN v.busy OR a.current_chats + v.chats >= a.max_concurrent_chats
+                                 THEN 'busy' ELSE a.status END,
+                   last_status_change = CASE WHEN v.busy OR a.current_chats + v.chats >= a.max_concurrent_chats
+                                             THEN %(now)s ELSE a.last_status_change END,
+                   write_uid = %(uid)s,
+                   write_date = %(now)s
+              FROM unnest(%(ids)s::int[], %(chats)s::int[], %(busy)s::bool[]) AS v(id, chats, busy), prev
+             WHERE a.id = v.id AND prev.id = a.id
+         RETURNING a.team_id, prev.status, a.status, a.active
+        """, {
+            'now': fields.Datetime.now(),
+            'uid': self.env.uid,
+            'ids': agent_ids,
+            'chats': [chats_by_agent.get(agent_id, 0) for agent_id in agent_ids],
+            'busy': [agent_id in busy_agent_ids for agent_id in agent_ids],
+        })
+        self._count_status_changes(self.env.cr.fetchall())
+        self.browse(agent_ids).invalidate_recordset(CHAT_COUNT_FIELDS)
+        self._api_bump(self._table)
 
-        return agents
+    def _record_handled(self, channel, handle_seconds):
+        """Count a completed interaction and add its handle time to the running mean
+
+        ``handle_seconds`` is None for an interaction completed without being
+        answered: it is counted but adds no handle time sample.
+        """
+        self.ensure_one()
+        counted = ['avg_handle_time', 'total_calls', 'total_chats']
+        self.flush_recordset(counted)
+        self.env.cr.execute("""
+            UPDATE cc_agent
+               SET avg_handle_time = COALESCE(avg_handle_time
+                                              + (%(minutes)s::float - avg_handle_time) / (handle_samples + 1),
+                                              avg_handle_time),
+                   handle_samples = handle_samples + CASE WHEN %(minutes)s::float IS NULL THEN 0 ELSE 1 END,
+                   total_calls = total_calls + CASE WHEN %(chat)s THEN 0 ELSE 1 END,
+                   total_chats = total_chats + CASE WHEN %(chat)s THEN 1 ELSE 0 END
+             WHERE id = %(id)s
+        """, {
+            'minutes': handle_seconds / 60.0 if handle_seconds is not None else None,
+            'chat': channel == 'chat',
+            'id': self.id,
+        })
+        self.invalidate_recordset(counted)
+        self._api_bump(self._table)
+
+    def _record_rating(self, rating, previous_rating=None):
+        """Add, replace or remove (``rating`` None) a rating sample of the running mean"""
+        self.ensure_one()
+        if rating == previous_rating:
+            return
+        self.flush_recordset(['avg_rating'])
+        if previous_rating is None:
+            query = """
+                UPDATE cc_agent
+                   SET avg_rating = avg_rating + (%(new)s - avg_rating) / (rating_samples + 1),
+                       rating_samples = rating_samples + 1
+                 WHERE id = %(id)s
+            """
+        elif rating is None:
+            query = """
+                UPDATE cc_agent
+                   SET avg_rating = CASE WHEN rating_samples > 1
+                                         THEN (avg_rating * rating_samples - %(old)s) / (rating_samples - 1)
+                                         ELSE 0 END,
+                       rating_samples = GREATEST(rating_samples - 1, 0)
+                 WHERE id = %(id)s
+            """
+        else:
+            query = """
+                UPDATE cc_agent
+                   SET avg_rating = avg_rating + (%(new)s - %(old)s)::float / GREATEST(rating_samples, 1)
+                 WHERE id = %(id)s
+            """
+        self.env.cr.execute(query, {'new': rating, 'old': previous_rating, 'id': self.id})
+        self.invalidate_recordset(['avg_rating'])
+        self._api_bump(self._table)
 
     def increment_chat_count(self):
         """Increment current chat count"""
-        for agent in self:
-            agent.current_chats += 1
-            if agent.current_chats >= agent.max_concurrent_chats:
-                agent.action_set_busy()
+        if not self:
+            return
+        # Done in SQL so concurrent increments cannot overwrite each other
+        self.flush_recordset()
+        self.env.cr.execute("""
+            WITH prev AS (
+                SELECT id, status FROM cc_agent WHERE id IN %(ids)s FOR UPDATE
+            )
+            UPDATE cc_agent a
+               SET current_chats = a.current_chats + 1,
+                   status = CASE WHEN a.current_chats + 1 >= a.max_concurrent_chats
+                                 THEN 'busy' ELSE a.status END,
+                   last_status_change = CASE WHEN a.current_chats + 1 >= a.max_concurrent_chats
+                                             THEN %(now)s ELSE a.last_status_change END,
+                   write_uid = %(uid)s,
+                   write_date = %(now)s
+              FROM prev
+             WHERE a.id = prev.id
+         RETURNING a.team_id, prev.status, a.status, a.active
+        """, {'now': fields.Datetime.now(), 'uid': self.env.uid, 'ids': tuple(self.ids)})
+        self._count_status_changes(self.env.cr.fetchall())
+        self.invalidate_recordset(CHAT_COUNT_FIELDS)
+        self._api_bump(self._table)
 
     def decrement_chat_count(self):
         """Decrement current chat count"""
-        for agent in self:
-            if agent.current_chats > 0:
-                agent.current_chats -= 1
-            if agent.current_chats < agent.max_concurrent_chats and agent.status == 'busy':
-                agent.action_set_available()
+        if not self:
+            return
+        self.flush_recordset()
+        self.env.cr.execute("""
+            WITH prev AS (
+                SELECT id, status FROM cc_agent WHERE id IN %(ids)s FOR UPDATE
+            )
+            UPDATE cc_agent a
+               SET current_chats = GREATEST(a.current_chats - 1, 0),
+                   status = CASE WHEN a.status = 'busy'
+                                  AND GREATEST(a.current_chats - 1, 0) < a.max_concurrent_chats
+                                 THEN 'available' ELSE a.status END,
+                   last_status_change = CASE WHEN a.status = 'busy'
+                                              AND GREATEST(a.current_chats - 1, 0) < a.max_concurrent_chats
+                                             THEN %(now)s ELSE a.last_status_change END,
+                   write_uid = %(uid)s,
+                   write_date = %(now)s
+              FROM prev
+             WHERE a.id = prev.id
+         RETURNING a.team_id, prev.status, a.status, a.active
+        """, {'now': fields.Datetime.now(), 'uid': self.env.uid, 'ids': tuple(self.ids)})
+        self._count_status_changes(self.env.cr.fetchall())
+        self.invalidate_recordset(CHAT_COUNT_FIELDS)
+        self._api_bump(self._table)
+        self._dispatch_waiting_calls()
 
-    def to_dict(self):
-        """Convert to dictionary for API response"""
-        self.ensure_one()
-        return {
-            'id': self.id,
-            'name': self.name,
-            'agent_code': self.agent_code,
-            'extension': self.extension,
-            'status': self.status,
-            'team_id': self.team_id.id if self.team_id else None,
-            'team_name': self.team_id.name if self.team_id else None,
-            'skill_ids': self.skill_ids.ids,
-            'skills': self.skill_ids.mapped('name'),
-            'can_voice': self.can_voice,
-            'can_chat': self.can_chat,
-            'can_email': self.can_email,
-            'can_social': self.can_social,
-            'max_concurrent_chats': self.max_concurrent_chats,
-            'current_chats': self.current_chats,
-            'total_calls': self.total_calls,
-            'total_chats': self.total_chats,
-            'avg_handle_time': self.avg_handle_time,
-            'avg_rating': self.avg_rating,
-            'last_status_change': self.last_status_change.isoformat() if self.last_status_change else None,
-        }
+    # API payload, serialized in bulk by omni.api.mixin
+    _api_fields = {
+        'id': ('id', 'value'),
+        'name': ('name', 'value'),
+        'agent_code': ('agent_code', 'value'),
+        'extension': ('extension', 'value'),
+        'status': ('status', 'value'),
+        'team_id': ('team_id', 'id'),
+        'team_name': ('team_id', 'name'),
+        'skill_ids': ('skill_ids', 'ids'),
+        'skills': ('skill_ids', 'names'),
+        'can_voice': ('can_voice', 'value'),
+        'can_chat': ('can_chat', 'value'),
+        'can_email': ('can_email', 'value'),
+        'can_social': ('can_social', 'value'),
+        'max_concurrent_chats': ('max_concurrent_chats', 'value'),
+        'current_chats': ('current_chats', 'value'),
+        'total_calls': ('total_calls', 'value'),
+        'total_chats': ('total_chats', 'value'),
+        'avg_handle_time': ('avg_handle_time', 'value'),
+        'avg_rating': ('avg_rating', 'value'),
+        'last_status_change': ('last_status_change', 'datetime'),
+    }
+    _api_expand = {
+        'team': 'team_id',
+        'skills': 'skill_ids',
+    }
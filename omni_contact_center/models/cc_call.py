@@ -1,8 +1,22 @@
+from collections import Counter, defaultdict
+
 from odoo import models, fields, api
+from odoo.tools import SQL
+from odoo.tools.sql import create_index
+
+from .cc_queue import HISTOGRAM_BOUNDS
+
+
+# Calls still being handled, counted whatever the reporting period
+LIVE_STATUSES = ['queued', 'ringing', 'in_progress', 'on_hold']
+
+# Fields that move a call between live counters
+LIVE_COUNTER_FIELDS = {'status', 'queue_id', 'channel'}
 
 
 class CCCall(models.Model):
     _name = 'cc.call'
+    _inherit = ['omni.api.mixin']
     _description = 'Contact Center Call/Interaction'
     _order = 'start_time desc'
 
@@ -118,11 +132,152 @@ class CCCall(models.Model):
     recording_url = fields.Char(string='Recording URL')
     has_recording = fields.Boolean(string='Has Recording', default=False)
 
+    def init(self):
+        super().init()
+        # Head-of-queue lookups for the waiting call dispatcher
+        create_index(self.env.cr, 'cc_call_status_queue_start_idx', 'cc_call',
+                     ['status', 'queue_id', 'start_time'])
+        # Keyset pagination of the call history
+        create_index(self.env.cr, 'cc_call_start_time_id_idx', 'cc_call',
+                     ['start_time DESC NULLS LAST', 'id DESC'])
+        self._backfill_metrics()
+
+    @api.model
+    def _backfill_metrics(self):
+        """Seed the online queue/agent metrics of records without samples from the call history"""
+        cr = self.env.cr
+        for metric, duration, condition in (
+            ('wait', 'wait_duration', "answer_time IS NOT NULL"),
+            ('handle', 'talk_duration', "status = 'completed' AND answer_time IS NOT NULL"),
+        ):
+            cr.execute(f"""
+                SELECT c.queue_id, width_bucket(GREATEST(c.{duration}, 0), %(bounds)s),
+                       count(*), sum(c.{duration})
+                  FROM cc_call c
+                  JOIN cc_queue q ON q.id = c.queue_id AND q.{metric}_samples = 0
+                 WHERE {condition}
+                 GROUP BY 1, 2
+            """, {'bounds': HISTOGRAM_BOUNDS})
+            histograms = defaultdict(lambda: [0] * len(HISTOGRAM_BOUNDS))
+            totals = defaultdict(lambda: [0, 0])
+            for queue_id, bucket, count, total in cr.fetchall():
+                histograms[queue_id][bucket - 1] += count
+                totals[queue_id][0] += count
+                totals[queue_id][1] += total
+            for queue_id, (count, total) in totals.items():
+                cr.execute(f"""
+                    UPDATE cc_queue
+                       SET avg_{metric}_time = %s, {metric}_samples = %s, {metric}_histogram = %s
+                     WHERE id = %s
+                """, [total / count, count, histograms[queue_id], queue_id])
+
+        cr.execute("""
+            UPDATE cc_agent a
+               SET avg_handle_time = h.minutes, handle_samples = h.samples
+              FROM (SELECT agent_id, avg(talk_duration) / 60.0 AS minutes, count(*) AS samples
+                      FROM cc_call
+                     WHERE status = 'completed' AND answer_time IS NOT NULL AND agent_id IS NOT NULL
+                     GROUP BY agent_id) h
+             WHERE a.id = h.agent_id AND a.handle_samples = 0
+        """)
+        cr.execute("""
+            UPDATE cc_agent a
+               SET avg_rating = r.rating, rating_samples = r.samples
+              FROM (SELECT agent_id, avg(customer_rating::int) AS rating, count(*) AS samples
+                      FROM cc_call
+                     WHERE customer_rating IS NOT NULL AND agent_id IS NOT NULL
+                     GROUP BY agent_id) r
+             WHERE a.id = r.agent_id AND a.rating_samples = 0
+        """)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        missing = [vals for vals in vals_list if not vals.get('name')]
+        for vals, name in zip(missing, self._next_call_names(len(missing))):
+            vals['name'] = name
+        calls = super().create(vals_list)
+        self.env['cc.live.counter']._apply_transition(Counter(), calls._live_counter_keys())
+        for call in calls.filtered('customer_rating'):
+            call._record_rating(None)
+        return calls
+
+    def write(self, vals):
+        counted = LIVE_COUNTER_FIELDS.intersection(vals)
+        if counted:
+            before = self._live_counter_keys()
+            previous_status = {call.id: call.status for call in self}
+        if 'customer_rating' in vals:
+            previous_rating = {call.id: call.customer_rating for call in self}
+        res = super().write(vals)
+        if counted:
+            self.env['cc.live.counter']._apply_transition(before, self._live_counter_keys())
+            for call in self:
+                call._record_transition(previous_status[call.id])
+        if 'customer_rating' in vals:
+            for call in self:
+                call._record_rating(previous_rating[call.id])
+        return res
+
+    def unlink(self):
+        before = self._live_counter_keys()
+        res = super().unlink()
+        self.env['cc.live.counter']._apply_transition(before, Counter())
+        return res
+
     @api.model
-    def create(self, vals):
-        if not vals.get('name'):
-            vals['name'] = self.env['ir.sequence'].next_by_code('cc.call') or 'New'
-        return super().create(vals)
+    def _check_interaction(self, channel, interaction_type='inbound'):
+        """Raise ValueError for a channel or interaction type a call cannot have"""
+        if channel not in self._fields['channel'].get_values(self.env):
+            raise ValueError(f'Invalid channel {channel}')
+        if interaction_type not in self._fields['interaction_type'].get_values(self.env):
+            raise ValueError(f'Invalid interaction_type {interaction_type}')
+
+    def _record_transition(self, previous_status):
+        """Feed the online queue/agent metrics when a call is answered or completed"""
+        self.ensure_one()
+        if self.status == previous_status:
+            return
+        if self.status == 'in_progress' and previous_status in ('queued', 'ringing') and self.queue_id:
+            if self.answer_time:
+                self.queue_id._record_duration('wait', self.wait_duration)
+        elif self.status == 'completed':
+            # Every completion counts for the agent, only answered ones carry a handle time
+            handle_seconds = self.talk_duration if self.answer_time else None
+            if self.queue_id and handle_seconds is not None:
+                self.queue_id._record_duration('handle', handle_seconds)
+            if self.agent_id:
+                self.agent_id._record_handled(self.channel, handle_seconds)
+
+    def _record_rating(self, previous_rating):
+        """Feed the agent rating mean when the customer rating changes"""
+        self.ensure_one()
+        if self.agent_id and self.customer_rating != previous_rating:
+            self.agent_id._record_rating(
+                int(self.customer_rating) if self.customer_rating else None,
+                int(previous_rating) if previous_rating else None,
+            )
+
+    def _live_counter_keys(self):
+        """Counter of the live counter keys of these calls"""
+        return Counter(('call', call.queue_id.id or 0, call.channel, call.status) for call in self)
+
+    @api.model
+    def _next_call_names(self, count):
+        """Get the next ``count`` call references from the cc.call sequence"""
+        if not count:
+            return []
+        sequence = self.env['ir.sequence'].sudo().search([
+            ('code', '=', 'cc.call'),
+            ('company_id', 'in', [self.env.company.id, False]),
+        ], order='company_id', limit=1)
+        if count > 1 and sequence.implementation == 'standard' and not sequence.use_date_range:
+            # Draw the whole block from the PostgreSQL sequence in one query
+            self.env.cr.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s)",
+                ['ir_sequence_%03d' % sequence.id, count]
+            )
+            return [sequence.get_next_char(row[0]) for row in self.env.cr.fetchall()]
+        return [self.env['ir.sequence'].next_by_code('cc.call') or 'New' for _ in range(count)]
 
     @api.depends('start_time', 'answer_time', 'end_time')
     def _compute_durations(self):
@@ -169,7 +324,20 @@ class CCCall(models.Model):
         })
         if self.agent_id:
             self.agent_id.action_set_after_call()
-            self.agent_id.total_calls += 1
+
+    def action_abandon(self):
+        """Caller hung up before the call was answered"""
+        calls = self.filtered(lambda c: c.status in ('queued', 'ringing'))
+        calls.write({
+            'status': 'abandoned',
+            'end_time': fields.Datetime.now()
+        })
+        # Release the capacity reserved for ringing calls
+        for call in calls.filtered('agent_id'):
+            if call.channel == 'chat':
+                call.agent_id.decrement_chat_count()
+            elif call.agent_id.status == 'busy':
+                call.agent_id.action_set_available()
 
     def action_transfer(self, target_agent_id):
         """Transfer call to another agent"""
@@ -189,30 +357,175 @@ class CCCall(models.Model):
         })
         return new_call
 
-    def to_dict(self):
-        """Convert to dictionary for API response"""
-        self.ensure_one()
-        return {
-            'id': self.id,
-            'name': self.name,
-            'interaction_type': self.interaction_type,
-            'channel': self.channel,
-            'status': self.status,
-            'agent_id': self.agent_id.id if self.agent_id else None,
-            'agent_name': self.agent_id.name if self.agent_id else None,
-            'queue_id': self.queue_id.id if self.queue_id else None,
-            'queue_name': self.queue_id.name if self.queue_id else None,
-            'caller_number': self.caller_number,
-            'caller_name': self.caller_name,
-            'shadow_profile_id': self.shadow_profile_id.id if self.shadow_profile_id else None,
-            'partner_id': self.partner_id.id if self.partner_id else None,
-            'start_time': self.start_time.isoformat() if self.start_time else None,
-            'answer_time': self.answer_time.isoformat() if self.answer_time else None,
-            'end_time': self.end_time.isoformat() if self.end_time else None,
-            'wait_duration': self.wait_duration,
-            'talk_duration': self.talk_duration,
-            'total_duration': self.total_duration,
-            'disposition': self.disposition,
-            'customer_rating': self.customer_rating,
-            'notes': self.notes,
+    @api.model
+    def _pop_waiting_call(self, agent):
+        """Lock and return the most urgent queued call the agent is eligible for
+
+        Only the oldest unlocked call of each eligible queue is considered (one
+        index probe per queue): calls already being handed out by a concurrent
+        dispatcher are skipped, not the whole queue. Heads are ranked by queue
+        priority, aged by one priority level per SLA answer period already
+        waited, so low priority queues cannot starve. As in routing, chat
+        queues are skipped once the agent has no chat capacity left.
+        """
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT c.id
+              FROM cc_queue_agent_eligibility e
+              JOIN cc_queue q ON q.id = e.queue_id
+              JOIN cc_agent a ON a.id = e.agent_id
+             CROSS JOIN LATERAL (
+                    SELECT id, start_time
+                      FROM cc_call
+                     WHERE status = 'queued' AND queue_id = e.queue_id
+                       AND (q.queue_type != 'chat' OR a.current_chats < a.max_concurrent_chats)
+                     ORDER BY start_time, id
+                     LIMIT 1
+                       FOR UPDATE SKIP LOCKED
+             ) c
+             WHERE e.agent_id = %s
+             ORDER BY q.priority
+                      + EXTRACT(EPOCH FROM (now() AT TIME ZONE 'UTC') - c.start_time)
+                      / GREATEST(q.sla_answer_seconds, 1) DESC,
+                      c.start_time, c.id
+             LIMIT 1
+        """, [agent.id])
+        row = self.env.cr.fetchone()
+        return self.browse(row[0] if row else ())
+
+    @api.model
+    def get_stats(self, date_from=None, date_to=None, date=None):
+        """Call counts by status and channel
+
+        Live calls are read from the live counters; with a date range, calls
+        started in [date_from, date_to) are broken down by status and channel
+        in one grouped query. ``completed_today`` keeps its original meaning:
+        calls completed (end_time) since ``date``, 0 without it.
+        """
+        statuses = self._fields['status'].get_values(self.env)
+        channels = self._fields['channel'].get_values(self.env)
+        live = {status: dict.fromkeys(channels, 0) for status in LIVE_STATUSES}
+        for (channel, status), count in self.env['cc.live.counter'].get_totals('call').items():
+            if status in live:
+                live[status][channel] = count
+
+        by_status = dict.fromkeys(statuses, 0)
+        period = bool(date_from or date_to)
+        if period:
+            conditions = [SQL("TRUE")]
+            if date_from:
+                conditions.append(SQL("start_time >= %s", fields.Datetime.to_datetime(date_from)))
+            if date_to:
+                conditions.append(SQL("start_time < %s", fields.Datetime.to_datetime(date_to)))
+            self.env.flush_all()
+            self.env.cr.execute(SQL("""
+                SELECT status, channel, count(*)
+                  FROM cc_call
+                 WHERE %s
+                 GROUP BY status, channel
+            """, SQL(" AND ").join(conditions)))
+            by_channel = dict.fromkeys(channels, 0)
+            by_status_channel = {status: dict.fromkeys(channels, 0) for status in statuses}
+            for status, channel, count in self.env.cr.fetchall():
+                by_status[status] += count
+                by_channel[channel] += count
+                by_status_channel[status][channel] += count
+
+        completed_today = 0
+        if date:
+            completed_today = self.search_count([
+                ('status', '=', 'completed'),
+                ('end_time', '>=', fields.Datetime.to_datetime(date)),
+            ])
+
+        stats = {
+            'queued': sum(live['queued'].values()),
+            'in_progress': sum(live['in_progress'].values()),
+            'completed_today': completed_today,
+            'live': live,
         }
+        if period:
+            stats['period'] = {
+                'date_from': date_from,
+                'date_to': date_to,
+                'total': sum(by_status.values()),
+                'by_status': by_status,
+                'by_channel': by_channel,
+                'by_status_channel': by_status_channel,
+            }
+        return stats
+
+    @api.model
+    def _export_query(self, date_from=None, date_to=None, queue_id=None, agent_id=None,
+                      channel=None, status=None):
+        """Return (columns, query) of the call history export, start_time in [date_from, date_to)"""
+        self.env.flush_all()
+        conditions = [SQL("TRUE")]
+        if date_from:
+            conditions.append(SQL("c.start_time >= %s", fields.Datetime.to_datetime(date_from)))
+        if date_to:
+            conditions.append(SQL("c.start_time < %s", fields.Datetime.to_datetime(date_to)))
+        if queue_id:
+            conditions.append(SQL("c.queue_id = %s", int(queue_id)))
+        if agent_id:
+            conditions.append(SQL("c.agent_id = %s", int(agent_id)))
+        if channel:
+            conditions.append(SQL("c.channel = %s", channel))
+        if status:
+            conditions.append(SQL("c.status = %s", status))
+
+        columns = [
+            'id', 'name', 'interaction_type', 'channel', 'status',
+            'agent_id', 'agent_name', 'queue_id', 'queue_name',
+            'caller_number', 'caller_name', 'shadow_profile_id', 'partner_id',
+            'start_time', 'answer_time', 'end_time',
+            'wait_duration', 'talk_duration', 'total_duration',
+            'disposition', 'customer_rating',
+        ]
+        query = SQL("""
+            SELECT c.id, c.name, c.interaction_type, c.channel, c.status,
+                   c.agent_id, e.name, c.queue_id, q.name,
+                   c.caller_number, c.caller_name, c.shadow_profile_id, c.partner_id,
+                   c.start_time, c.answer_time, c.end_time,
+                   c.wait_duration, c.talk_duration, c.total_duration,
+                   c.disposition, c.customer_rating
+              FROM cc_call c
+              LEFT JOIN cc_agent a ON a.id = c.agent_id
+              LEFT JOIN hr_employee e ON e.id = a.employee_id
+              LEFT JOIN cc_queue q ON q.id = c.queue_id
+             WHERE %s
+             ORDER BY c.start_time ASC NULLS FIRST, c.id
+        """, SQL(" AND ").join(conditions))
+        return columns, query
+
+    # API payload, serialized in bulk by omni.api.mixin
+    _api_fields = {
+        'id': ('id', 'value'),
+        'name': ('name', 'value'),
+        'interaction_type': ('interaction_type', 'value'),
+        'channel': ('channel', 'value'),
+        'status': ('status', 'value'),
+        'agent_id': ('agent_id', 'id'),
+        'agent_name': ('agent_id', 'name'),
+        'queue_id': ('queue_id', 'id'),
+        'queue_name': ('queue_id', 'name'),
+        'caller_number': ('caller_number', 'value'),
+        'caller_name': ('caller_name', 'value'),
+        'shadow_profile_id': ('shadow_profile_id', 'id'),
+        'partner_id': ('partner_id', 'id'),
+        'start_time': ('start_time', 'datetime'),
+        'answer_time': ('answer_time', 'datetime'),
+        'end_time': ('end_time', 'datetime'),
+        'wait_duration': ('wait_duration', 'value'),
+        'talk_duration': ('talk_duration', 'value'),
+        'total_duration': ('total_duration', 'value'),
+        'disposition': ('disposition', 'value'),
+        'customer_rating': ('customer_rating', 'value'),
+        'notes': ('notes', 'value'),
+    }
+    _api_keyset = 'start_time'
+    _api_expand = {
+        'agent': 'agent_id',
+        'queue': 'queue_id',
+        'shadow_profile': 'shadow_profile_id',
+    }
@@ -0,0 +1,219 @@
+import logging
+from collections import Counter
+
+from odoo import models, fields, api
+from odoo.tools.sql import create_index
+
+_logger = logging.getLogger(__name__)
+
+# Expected counter values, one query per dimension
+RECONCILE_SQL = {
+    'agent': """
+        SELECT 'agent', COALESCE(team_id, 0), '', status, count(*)
+          FROM cc_agent
+         WHERE active
+         GROUP BY 2, 4
+    """,
+    'call': """
+        SELECT 'call', COALESCE(queue_id, 0), channel, status, count(*)
+          FROM cc_call
+         GROUP BY 2, 3, 4
+    """,
+}
+
+
+class CCLiveCounter(models.Model):
+    _name = 'cc.live.counter'
+    _description = 'Contact Center Live Counter'
+    _log_access = False
+
+    # Incrementally maintained counts: active agents by (team, status) and
+    # calls by (queue, channel, status). A counter is the sum of its rows:
+    # every state change appends delta rows in the same transaction instead
+    # of updating a shared row, so concurrent transitions never wait on each
+    # other. A scheduled compaction folds the rows of each key into one and
+    # the reconciliation corrects any drift (e.g. rows changed outside the
+    # ORM hooks).
+    dimension = fields.Selection([
+        ('agent', 'Agents by Team'),
+        ('call', 'Calls by Queue'),
+    ], string='Dimension', required=True)
+    scope_id = fields.Integer(string='Team / Queue ID', required=True, default=0)
+    channel = fields.Char(string='Channel', required=True, default='')
+    status = fields.Char(string='Status', required=True)
+    value = fields.Integer(string='Count', default=0)
+
+    def init(self):
+        # Keys hold several delta rows now
+        self.env.cr.execute("ALTER TABLE cc_live_counter DROP CONSTRAINT IF EXISTS cc_live_counter_key_unique")
+        create_index(self.env.cr, 'cc_live_counter_key_idx', 'cc_live_counter',
+                     ['dimension', 'scope_id', 'channel', 'status'])
+        # Full rebuild on install/upgrade, incremental hooks keep it current afterwards
+        self._reconcile()
+
+    @api.model
+    def _apply(self, deltas):
+        """Append ``deltas`` to the counters, one row per changed key
+
+        :param deltas: {(dimension, scope_id, channel, status): delta}, the
+            scope is the team/queue id or 0 and the channel '' for agents
+        """
+        deltas = [(key, delta) for key, delta in deltas.items() if delta]
+        if not deltas:
+            return
+        self.env.cr.execute("""
+            INSERT INTO cc_live_counter (dimension, scope_id, channel, status, value)
+            SELECT * FROM unnest(%s::varchar[], %s::int[], %s::varchar[], %s::varchar[], %s::int[])
+        """, [
+            [key[0] for key, delta in deltas],
+            [key[1] for key, delta in deltas],
+            [key[2] for key, delta in deltas],
+            [key[3] for key, delta in deltas],
+            [delta for key, delta in deltas],
+        ])
+        self.env['omni.api.mixin']._api_bump(self._table)
+
+    @api.model
+    def _apply_transition(self, before, after):
+        """Apply the difference between two Counters of keys, return the deltas"""
+        deltas = Counter(after)
+        deltas.subtract(before)
+        self._apply(deltas)
+        return deltas
+
+    @api.model
+    def _move_scope(self, dimension, scope_ids):
+        """Merge the counters of deleted teams/queues into the "none" scope
+
+        Agents and calls lose their team/queue through ON DELETE SET NULL,
+        which bypasses the ORM hooks.
+        """
+        if not scope_ids:
+            return
+        self.env.cr.execute("""
+            WITH moved AS (
+                DELETE FROM cc_live_counter
+                 WHERE dimension = %(dimension)s AND scope_id IN %(scope_ids)s
+             RETURNING channel, status, value
+            )
+            INSERT INTO cc_live_counter (dimension, scope_id, channel, status, value)
+            SELECT %(dimension)s, 0, channel, status, sum(value)
+              FROM moved
+             GROUP BY channel, status
+            HAVING sum(value) != 0
+        """, {'dimension': dimension, 'scope_ids': tuple(scope_ids)})
+        self.env['omni.api.mixin']._api_bump(self._table)
+
+    @api.model
+    def _compact(self):
+        """Fold the delta rows of each counter into a single row, dropping zero counters
+
+        Only the rows visible to this transaction are folded, deltas appended
+        concurrently are kept as they are.
+        """
+        self.env.cr.execute("""
+            WITH folded AS (
+                DELETE FROM cc_live_counter
+             RETURNING dimension, scope_id, channel, status, value
+            )
+            INSERT INTO cc_live_counter (dimension, scope_id, channel, status, value)
+            SELECT dimension, scope_id, channel, status, sum(value)
+              FROM folded
+             GROUP BY dimension, scope_id, channel, status
+            HAVING sum(value) != 0
+        """)
+
+    @api.model
+    def _reconcile(self, dimensions=('agent', 'call')):
+        """Replace the counters with values recomputed from the agent and call tables
+
+        The delta rows of a dimension are compacted into one row per expected
+        key; deltas appended by concurrent transactions are not visible here
+        and are kept, as are the rows they count. Returns the number of keys
+        that had drifted.
+        """
+        self.env.flush_all()
+        cr = self.env.cr
+        drifted = 0
+        for dimension in dimensions:
+            cr.execute(f"""
+                WITH expected (dimension, scope_id, channel, status, value) AS (
+                    {RECONCILE_SQL[dimension]}
+                ),
+                removed AS (
+                    DELETE FROM cc_live_counter
+                     WHERE dimension = %(dimension)s
+                 RETURNING scope_id, channel, status, value
+                ),
+                current AS (
+                    SELECT scope_id, channel, status, sum(value) AS value
+                      FROM removed
+                     GROUP BY scope_id, channel, status
+                ),
+                compacted AS (
+                    INSERT INTO cc_live_counter (dimension, scope_id, channel, status, value)
+                    SELECT * FROM expected
+                )
+                SELECT count(*)
+                  FROM expected e
+                  FULL JOIN current c USING (scope_id, channel, status)
+                 WHERE COALESCE(e.value, 0) != COALESCE(c.value, 0)
+            """, {'dimension': dimension})
+            drifted += cr.fetchone()[0]
+        if 'call' in dimensions:
+            self.env['cc.queue'].invalidate_model(['calls_waiting'])
+        if drifted:
+            _logger.info("Reconciled %s drifted contact center live counters", drifted)
+            self.env['omni.api.mixin']._api_bump(self._table)
+        return drifted
+
+    @api.model
+    def get_live(self):
+        """Return the non-zero counters of both dimensions"""
+        self.env.cr.execute("""
+            SELECT dimension, scope_id, channel, status, sum(value)
+              FROM cc_live_counter
+             GROUP BY dimension, scope_id, channel, status
+            HAVING sum(value) != 0
+             ORDER BY dimension, scope_id, channel, status
+        """)
+        live = {'agents': [], 'calls': []}
+        for dimension, scope_id, channel, status, value in self.env.cr.fetchall():
+            if dimension == 'agent':
+                live['agents'].append({
+                    'team_id': scope_id or None,
+                    'status': status,
+                    'count': value,
+                })
+            else:
+                live['calls'].append({
+                    'queue_id': scope_id or None,
+                    'channel': channel,
+                    'status': status,
+                    'count': value,
+                })
+        return live
+
+    @api.model
+    def get_totals(self, dimension):
+        """Return {(channel, status): count} summed over all teams/queues"""
+        self.env.cr.execute("""
+            SELECT channel, status, sum(value)
+              FROM cc_live_counter
+             WHERE dimension = %s
+             GROUP BY channel, status
+        """, [dimension])
+        return {(channel, status): value for channel, status, value in self.env.cr.fetchall()}
+
+    @api.model
+    def get_scope_totals(self, dimension, status, scope_ids):
+        """Return {scope_id: count} of ``status`` summed over channels"""
+        if not scope_ids:
+            return {}
+        self.env.cr.execute("""
+            SELECT scope_id, sum(value)
+              FROM cc_live_counter
+             WHERE dimension = %s AND status = %s AND scope_id IN %s
+             GROUP BY scope_id
+        """, [dimension, status, tuple(scope_ids)])
+        return dict(self.env.cr.fetchall())
@@ -1,8 +1,88 @@
+import bisect
+from collections import defaultdict
+
+import numpy as np
+
 from odoo import models, fields, api
 
+from ..tools.route_trace import NULL_TRACER
+
+
+# Routing strategy -> ORDER BY clause over the candidate agents (alias "a").
+# Each ordering matches a partial index on available agents (see cc.agent),
+# so picking the next agent is a LIMIT 1 walk of that index.
+ROUTING_ORDER = {
+    # Longest idle first, agents who never took a call come first
+    'round_robin': 'a.last_call_time ASC NULLS FIRST, a.id',
+    'least_busy': 'a.current_chats ASC, a.id',
+    # Most skills first
+    'skill_based': 'cardinality(a.skill_key) DESC, a.id',
+    'priority': 'a.id',
+    'random': 'random()',
+}
+
+# Agent features used by the scored strategy, one column per score weight
+SCORE_COLUMNS = """
+    EXTRACT(EPOCH FROM (now() AT TIME ZONE 'UTC') - a.last_call_time),
+    a.current_chats::float / GREATEST(a.max_concurrent_chats, 1),
+    cardinality(a.skill_key),
+    a.avg_rating,
+    a.avg_handle_time
+"""
+# +1 when a higher feature value is better, -1 when lower is better
+SCORE_DIRECTIONS = np.array([1.0, -1.0, 1.0, 1.0, -1.0])
+
+# Largest batch accepted by route_interactions
+MAX_ROUTE_BATCH = 500
+
+# How long claim_agent waits for candidates locked by concurrent routers
+CLAIM_LOCK_TIMEOUT = '2s'
+
+# Lower bounds (seconds) of the wait/handle time histogram buckets, the last
+# bucket is open ended. Bucket n (1-based, as in PostgreSQL arrays) holds
+# durations in [HISTOGRAM_BOUNDS[n - 1], HISTOGRAM_BOUNDS[n]).
+HISTOGRAM_BOUNDS = [0, 5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 240, 300, 450, 600, 900, 1200, 1800, 3600]
+
+
+def histogram_bucket(seconds):
+    """1-based histogram bucket of a duration"""
+    return bisect.bisect_right(HISTOGRAM_BOUNDS, max(seconds, 0))
+
+
+def histogram_percentile(histogram, quantile):
+    """Estimate a quantile (0 to 1) of a duration histogram, interpolating within buckets"""
+    total = sum(histogram)
+    if not total:
+        return 0.0
+    rank = quantile * total
+    seen = 0
+    for index, count in enumerate(histogram):
+        if count and seen + count >= rank:
+            low = HISTOGRAM_BOUNDS[index]
+            if index + 1 == len(HISTOGRAM_BOUNDS):
+                return float(low)
+            high = HISTOGRAM_BOUNDS[index + 1]
+            return low + (high - low) * (rank - seen) / count
+        seen += count
+    return float(HISTOGRAM_BOUNDS[-1])
+
+
+# Sorted ids of the queue's active required skills, kept in required_skill_key
+REQUIRED_SKILL_KEY_SQL = """
+    UPDATE cc_queue q
+       SET required_skill_key = COALESCE((
+            SELECT array_agg(r.skill_id ORDER BY r.skill_id)
+              FROM cc_queue_skill_rel r
+              JOIN cc_skill s ON s.id = r.skill_id AND s.active
+             WHERE r.queue_id = q.id
+       ), '{{}}')
+     {where}
+"""
+
 
 class CCQueue(models.Model):
     _name = 'cc.queue'
+    _inherit = ['omni.api.mixin']
     _description = 'Contact Center Queue'
     _order = 'priority desc, name'
 
@@ -29,8 +109,16 @@ class CCQueue(models.Model):
         ('skill_based', 'Skill Based'),
         ('priority', 'Priority'),
         ('random', 'Random'),
+        ('scored', 'Weighted Score'),
     ], string='Routing Strategy', default='round_robin', required=True)
 
+    # Weights of the scored strategy
+    score_weight_idle = fields.Float(string='Idle Time Weight', default=1.0)
+    score_weight_load = fields.Float(string='Load Weight', default=1.0)
+    score_weight_skill = fields.Float(string='Skill Coverage Weight', default=0.5)
+    score_weight_rating = fields.Float(string='Rating Weight', default=0.5)
+    score_weight_handle_time = fields.Float(string='Handle Time Weight', default=0.5)
+
     # Required skill for this queue
     required_skill_ids = fields.Many2many(
         'cc.skill',
@@ -60,9 +148,17 @@ class CCQueue(models.Model):
     )
 
     # Statistics
-    calls_waiting = fields.Integer(string='Calls Waiting', default=0)
+    calls_waiting = fields.Integer(string='Calls Waiting', compute='_compute_calls_waiting')
     avg_wait_time = fields.Float(string='Avg Wait Time (sec)', default=0.0)
     avg_handle_time = fields.Float(string='Avg Handle Time (sec)', default=0.0)
+    wait_time_p50 = fields.Float(string='Median Wait Time (sec)', compute='_compute_time_percentiles')
+    wait_time_p90 = fields.Float(string='P90 Wait Time (sec)', compute='_compute_time_percentiles')
+    handle_time_p50 = fields.Float(string='Median Handle Time (sec)', compute='_compute_time_percentiles')
+    handle_time_p90 = fields.Float(string='P90 Handle Time (sec)', compute='_compute_time_percentiles')
+    available_agent_count = fields.Integer(
+        string='Available Agents',
+        compute='_compute_available_agent_count'
+    )
 
     # Working hours
     is_24_7 = fields.Boolean(string='24/7 Operation', default=False)
@@ -73,99 +169,440 @@ class CCQueue(models.Model):
         ('code_unique', 'unique(code)', 'Queue code must be unique!'),
     ]
 
-    def get_available_agents(self):
-        """Get available agents for this queue based on routing strategy"""
-        self.ensure_one()
+    def init(self):
+        super().init()
+        self.env.cr.execute("""
+            ALTER TABLE cc_queue ADD COLUMN IF NOT EXISTS required_skill_key integer[] NOT NULL DEFAULT '{}'
+        """)
+        self.env.cr.execute(REQUIRED_SKILL_KEY_SQL.format(where=''))
 
-        # Get agents from assigned teams
-        agents = self.env['cc.agent']
-        for team in self.team_ids:
-            agents |= team.agent_ids
+        # Sample counts and histograms behind the online wait/handle time metrics,
+        # filled from the call history by cc.call
+        for metric in ('wait', 'handle'):
+            self.env.cr.execute(f"""
+                ALTER TABLE cc_queue
+                    ADD COLUMN IF NOT EXISTS {metric}_samples integer NOT NULL DEFAULT 0,
+                    ADD COLUMN IF NOT EXISTS {metric}_histogram integer[] NOT NULL
+                        DEFAULT array_fill(0, ARRAY[{len(HISTOGRAM_BOUNDS)}])
+            """)
 
-        # Filter by availability
-        agents = agents.filtered(lambda a: a.status == 'available')
+    @api.model_create_multi
+    def create(self, vals_list):
+        queues = super().create(vals_list)
+        queues._sync_required_skill_key()
+        self.env['cc.queue.agent.eligibility']._refresh(queue_ids=queues.ids)
+        return queues
 
-        # Filter by channel capability
-        channel_map = {
-            'voice': 'can_voice',
-            'chat': 'can_chat',
-            'email': 'can_email',
-            'social': 'can_social',
-        }
-        if self.queue_type in channel_map:
-            field_name = channel_map[self.queue_type]
-            agents = agents.filtered(lambda a: getattr(a, field_name, False))
-
-        # Filter by required skills
-        if self.required_skill_ids:
-            required_codes = set(self.required_skill_ids.mapped('code'))
-            agents = agents.filtered(
-                lambda a: required_codes.issubset(set(a.skill_ids.mapped('code')))
+    def write(self, vals):
+        res = super().write(vals)
+        if 'required_skill_ids' in vals:
+            self._sync_required_skill_key()
+        if {'team_ids', 'required_skill_ids', 'queue_type'}.intersection(vals):
+            self.env['cc.queue.agent.eligibility']._refresh(queue_ids=self.ids)
+        return res
+
+    def unlink(self):
+        # Calls lose their queue through the database ON DELETE SET NULL
+        queue_ids = self.ids
+        res = super().unlink()
+        self.env['cc.live.counter']._move_scope('call', queue_ids)
+        return res
+
+    def _compute_time_percentiles(self):
+        """Estimate wait/handle time percentiles from the queue histograms"""
+        histograms = {}
+        if self.ids:
+            self.env.cr.execute(
+                "SELECT id, wait_histogram, handle_histogram FROM cc_queue WHERE id IN %s",
+                [tuple(self.ids)]
             )
+            histograms = {row[0]: row[1:] for row in self.env.cr.fetchall()}
+        for queue in self:
+            wait, handle = histograms.get(queue.id, ([], []))
+            queue.wait_time_p50 = histogram_percentile(wait, 0.5)
+            queue.wait_time_p90 = histogram_percentile(wait, 0.9)
+            queue.handle_time_p50 = histogram_percentile(handle, 0.5)
+            queue.handle_time_p90 = histogram_percentile(handle, 0.9)
+
+    def _record_duration(self, metric, seconds):
+        """Add a wait or handle time sample to the running mean and histogram"""
+        self.ensure_one()
+        field = f'avg_{metric}_time'
+        self.flush_recordset([field])
+        # Single UPDATE: concurrent samples are serialized on the queue row
+        self.env.cr.execute(f"""
+            UPDATE cc_queue
+               SET {field} = {field} + (%(seconds)s - {field}) / ({metric}_samples + 1),
+                   {metric}_samples = {metric}_samples + 1,
+                   {metric}_histogram[%(bucket)s] = {metric}_histogram[%(bucket)s] + 1
+             WHERE id = %(id)s
+        """, {'seconds': seconds, 'bucket': histogram_bucket(seconds), 'id': self.id})
+        self.invalidate_recordset([field])
+        self._api_bump(self._table)
+
+    def _compute_calls_waiting(self):
+        """Read the queued call counts of all queues from the live counters"""
+        waiting = self.env['cc.live.counter'].get_scope_totals('call', 'queued', self.filtered('id').ids)
+        for queue in self:
+            queue.calls_waiting = waiting.get(queue.id, 0)
+
+    def _compute_available_agent_count(self):
+        """Count routable agents of all queues in one grouped query"""
+        queues = self.filtered('id')
+        counts = {}
+        if queues:
+            self.env['cc.agent'].flush_model(['status', 'current_chats', 'max_concurrent_chats'])
+            self.env['cc.queue.agent.eligibility'].flush_model()
+            self.env.cr.execute("""
+                SELECT e.queue_id, count(*)
+                  FROM cc_queue_agent_eligibility e
+                  JOIN cc_queue q ON q.id = e.queue_id
+                  JOIN cc_agent a ON a.id = e.agent_id
+                 WHERE e.queue_id IN %s
+                   AND a.status = 'available'
+                   AND (q.queue_type != 'chat' OR a.current_chats < a.max_concurrent_chats)
+                 GROUP BY e.queue_id
+            """, [tuple(queues.ids)])
+            counts = dict(self.env.cr.fetchall())
+        for queue in self:
+            queue.available_agent_count = counts.get(queue.id, 0)
+
+    def _sync_required_skill_key(self):
+        """Recompute the required_skill_key array from the required skills"""
+        if not self:
+            return
+        self.env.flush_all()
+        self.env.cr.execute(REQUIRED_SKILL_KEY_SQL.format(where='WHERE q.id IN %s'), [tuple(self.ids)])
+
+    def _fetch_available_agents(self, columns='a.id', limit=None, lock=False, tracer=NULL_TRACER):
+        """Fetch rows of available agents for this queue, ordered by routing strategy
+
+        With ``lock``, the returned agent rows are locked FOR UPDATE and rows
+        already locked by a concurrent router are skipped; with
+        ``lock='wait'`` they are waited for instead.
+        """
+        self.ensure_one()
+        conditions = ["a.status = 'available'"]
 
         # For chat, also check capacity
         if self.queue_type == 'chat':
-            agents = agents.filtered(
-                lambda a: a.current_chats < a.max_concurrent_chats
-            )
+            conditions.append("a.current_chats < a.max_concurrent_chats")
+
+        tail = ''
+        if limit:
+            tail += f' LIMIT {int(limit)}'
+        if lock:
+            tail += ' FOR UPDATE OF a' if lock == 'wait' else ' FOR UPDATE OF a SKIP LOCKED'
+
+        self.env.flush_all()
+        query = f"""
+            SELECT {{columns}}
+              FROM cc_queue_agent_eligibility e
+              JOIN cc_agent a ON a.id = e.agent_id
+             WHERE e.queue_id = %(queue_id)s
+               AND {' AND '.join(conditions)}
+        """
+        if tracer.enabled:
+            self._trace_filter_counts(tracer)
+
+        if self.routing_strategy != 'scored':
+            order = ROUTING_ORDER.get(self.routing_strategy, 'a.id')
+            with tracer.stage('candidate_fetch', strategy=self.routing_strategy, lock=lock) as stage:
+                self.env.cr.execute(
+                    query.format(columns=columns) + f" ORDER BY {order} {tail}",
+                    {'queue_id': self.id}
+                )
+                rows = self.env.cr.fetchall()
+                stage['candidates'] = len(rows)
+            return rows
+
+        # Rank every candidate in memory, then fetch (and lock) in rank order
+        with tracer.stage('candidate_fetch', strategy=self.routing_strategy, lock=False) as stage:
+            self.env.cr.execute(query.format(columns='a.id, ' + SCORE_COLUMNS), {'queue_id': self.id})
+            rows = self.env.cr.fetchall()
+            stage['candidates'] = len(rows)
+        with tracer.stage('strategy_ordering', strategy=self.routing_strategy):
+            ranked_ids = self._rank_by_score(rows)
+        with tracer.stage('ranked_fetch', lock=lock) as stage:
+            self.env.cr.execute(f"""
+                SELECT {columns}
+                  FROM unnest(%(ids)s::int[]) WITH ORDINALITY AS r(id, rank)
+                  JOIN cc_agent a ON a.id = r.id
+                 WHERE {' AND '.join(conditions)}
+                 ORDER BY r.rank
+                 {tail}
+            """, {'ids': ranked_ids})
+            rows = self.env.cr.fetchall()
+            stage['candidates'] = len(rows)
+        return rows
+
+    def _trace_filter_counts(self, tracer):
+        """Record how many candidates survive each routing filter (trace mode only)"""
+        with tracer.stage('filters') as stage:
+            self.env.cr.execute("""
+                SELECT count(*),
+                       count(*) FILTER (WHERE a.status = 'available'),
+                       count(*) FILTER (WHERE a.status = 'available'
+                                          AND a.current_chats < a.max_concurrent_chats)
+                  FROM cc_queue_agent_eligibility e
+                  JOIN cc_agent a ON a.id = e.agent_id
+                 WHERE e.queue_id = %s
+            """, [self.id])
+            eligible, available, with_capacity = self.env.cr.fetchone()
+            stage['eligible'] = eligible
+            stage['available'] = available
+            if self.queue_type == 'chat':
+                stage['with_capacity'] = with_capacity
 
-        return agents
+    def _rank_by_score(self, rows):
+        """Order (agent id, *SCORE_COLUMNS) rows best first by weighted score"""
+        self.ensure_one()
+        if not rows:
+            return []
+        data = np.array(rows, dtype=float)
+        ids = data[:, 0].astype(np.int64)
+        features = data[:, 1:]
+
+        # Agents who never took a call count as the longest idle
+        idle = features[:, 0]
+        never = np.isnan(idle)
+        if never.any():
+            idle[never] = 0.0 if never.all() else np.nanmax(idle) + 1
+        features = np.nan_to_num(features)
+
+        # Min-max normalise each feature to [0, 1] over the candidate set
+        low = features.min(axis=0)
+        span = features.max(axis=0) - low
+        normalised = np.divide(features - low, span, out=np.zeros_like(features), where=span > 0)
+
+        weights = np.array([
+            self.score_weight_idle,
+            self.score_weight_load,
+            self.score_weight_skill,
+            self.score_weight_rating,
+            self.score_weight_handle_time,
+        ]) * SCORE_DIRECTIONS
+        scores = normalised @ weights
+        return ids[np.argsort(-scores, kind='stable')].tolist()
+
+    def _get_available_agent_ids(self, limit=None, lock=False, tracer=NULL_TRACER):
+        """Get ids of available agents for this queue, ordered by routing strategy"""
+        rows = self._fetch_available_agents(limit=limit, lock=lock, tracer=tracer)
+        return [row[0] for row in rows]
+
+    def get_available_agents(self):
+        """Get available agents for this queue, ordered by routing strategy"""
+        self.ensure_one()
+        return self.env['cc.agent'].browse(self._get_available_agent_ids())
 
-    def route_to_agent(self):
+    def route_to_agent(self, tracer=NULL_TRACER):
         """Route to best available agent based on strategy"""
         self.ensure_one()
-        agents = self.get_available_agents()
+        agent_ids = self._get_available_agent_ids(limit=1, tracer=tracer)
+        if not agent_ids:
+            return False
+        return self.env['cc.agent'].browse(agent_ids)
+
+    def claim_agent(self, channel='voice', tracer=NULL_TRACER):
+        """Atomically reserve the best available agent for an interaction
+
+        The candidate row is locked with SKIP LOCKED so concurrent routers
+        spread over different agents instead of waiting on (or double
+        booking) the same one. When every candidate is locked, the best one
+        is waited for (at most CLAIM_LOCK_TIMEOUT) rather than queueing the
+        call while capacity may be free. Under REPEATABLE READ, an agent
+        claimed and committed by another transaction after our snapshot
+        raises a serialization failure, a lock timeout raises
+        LockNotAvailable; the HTTP layer retries both.
 
-        if not agents:
+        The channel is validated before anything is reserved; callers creating
+        the call afterwards should do both in one savepoint.
+        """
+        self.ensure_one()
+        self.env['cc.call']._check_interaction(channel)
+        agent_ids = self._get_available_agent_ids(limit=1, lock=True, tracer=tracer)
+        if not agent_ids:
+            cr = self.env.cr
+            cr.execute(
+                "SELECT current_setting('lock_timeout'), set_config('lock_timeout', %s, true)",
+                [CLAIM_LOCK_TIMEOUT]
+            )
+            previous_timeout = cr.fetchone()[0]
+            agent_ids = self._get_available_agent_ids(limit=1, lock='wait', tracer=tracer)
+            cr.execute("SELECT set_config('lock_timeout', %s, true)", [previous_timeout])
+        if not agent_ids:
             return False
+        agent = self.env['cc.agent'].browse(agent_ids)
+        with tracer.stage('agent_claim', agent_id=agent.id):
+            agent.reserve_for_channel(channel)
+        return agent
 
-        if self.routing_strategy == 'round_robin':
-            # Sort by last call time (oldest first)
-            return agents.sorted(
-                key=lambda a: a.last_call_time or fields.Datetime.now(),
-                reverse=False
-            )[:1]
+    @api.model
+    def route_interactions(self, interactions):
+        """Route a batch of interactions, returning one result per item in input order
 
-        elif self.routing_strategy == 'least_busy':
-            # Sort by current chats (least first)
-            return agents.sorted(key=lambda a: a.current_chats)[:1]
+        Items are validated up front, invalid ones get an error result and
+        reserve nothing. Queues are resolved once, candidates are fetched and
+        locked once per queue, all calls are created in a single create() and
+        agent capacity is then reserved in a single UPDATE.
+        """
+        if len(interactions) > MAX_ROUTE_BATCH:
+            raise ValueError(f'At most {MAX_ROUTE_BATCH} interactions per batch')
+        results = [None] * len(interactions)
 
-        elif self.routing_strategy == 'skill_based':
-            # Sort by skill count (most skills first)
-            return agents.sorted(
-                key=lambda a: len(a.skill_ids),
-                reverse=True
-            )[:1]
+        Call = self.env['cc.call']
+        valid = {}
+        for index, item in enumerate(interactions):
+            try:
+                if not isinstance(item, dict):
+                    raise ValueError('interaction must be an object')
+                Call._check_interaction(item.get('channel', 'voice'), item.get('interaction_type', 'inbound'))
+                if item.get('queue_id'):
+                    item = dict(item, queue_id=int(item['queue_id']))
+                elif not item.get('queue_code'):
+                    raise ValueError('queue_code or queue_id required')
+            except (ValueError, TypeError) as e:
+                results[index] = {'success': False, 'error': str(e)}
+                continue
+            valid[index] = item
+        interactions = [valid.get(index) for index in range(len(interactions))]
 
-        elif self.routing_strategy == 'priority':
-            # Sort by team priority (if applicable)
-            return agents[:1]
+        # Resolve queues once
+        queue_ids = {item['queue_id'] for item in valid.values() if item.get('queue_id')}
+        queue_codes = {
+            item['queue_code'] for item in valid.values()
+            if not item.get('queue_id') and item.get('queue_code')
+        }
+        queues_by_id = {q.id: q for q in self.browse(queue_ids).exists()}
+        queues_by_code = {}
+        if queue_codes:
+            queues_by_code = {q.code: q for q in self.search([('code', 'in', list(queue_codes))])}
 
-        elif self.routing_strategy == 'random':
-            import random
-            return random.choice(agents) if agents else False
+        items_by_queue = defaultdict(list)
+        for index, item in valid.items():
+            if item.get('queue_id'):
+                queue = queues_by_id.get(item['queue_id'])
+            else:
+                queue = queues_by_code.get(item['queue_code'])
+            if not queue:
+                results[index] = {'success': False, 'error': 'Queue not found'}
+                continue
+            items_by_queue[queue].append(index)
 
-        return agents[:1] if agents else False
+        # Assign agents per queue, agent capacity is shared across queues
+        capacity = {}  # agent id -> [chats left, busy]
+        assigned = {}  # item index -> agent id
+        for queue, indexes in items_by_queue.items():
+            exhausted = sum(1 for chats_left, busy in capacity.values() if busy or not chats_left)
+            rows = queue._fetch_available_agents(
+                columns='a.id, a.current_chats, a.max_concurrent_chats',
+                limit=len(indexes) + exhausted,
+                lock=True,
+            )
+            for agent_id, current_chats, max_chats in rows:
+                capacity.setdefault(agent_id, [max(max_chats - current_chats, 1), False])
+            candidates = [row[0] for row in rows]
+            pointer = 0
+            for index in indexes:
+                is_chat = interactions[index].get('channel', 'voice') == 'chat'
+                for step in range(len(candidates)):
+                    agent_id = candidates[(pointer + step) % len(candidates)]
+                    chats_left, busy = capacity[agent_id]
+                    if busy or not chats_left:
+                        continue
+                    if is_chat:
+                        capacity[agent_id][0] -= 1
+                    else:
+                        capacity[agent_id][1] = True
+                    assigned[index] = agent_id
+                    pointer = (pointer + step + 1) % len(candidates)
+                    break
 
-    def to_dict(self):
-        """Convert to dictionary for API response"""
-        self.ensure_one()
-        return {
-            'id': self.id,
-            'name': self.name,
-            'code': self.code,
-            'description': self.description,
-            'queue_type': self.queue_type,
-            'routing_strategy': self.routing_strategy,
-            'priority': self.priority,
-            'required_skill_ids': self.required_skill_ids.ids,
-            'required_skills': self.required_skill_ids.mapped('name'),
-            'team_ids': self.team_ids.ids,
-            'sla_answer_seconds': self.sla_answer_seconds,
-            'sla_abandon_seconds': self.sla_abandon_seconds,
-            'calls_waiting': self.calls_waiting,
-            'avg_wait_time': self.avg_wait_time,
-            'avg_handle_time': self.avg_handle_time,
-            'is_24_7': self.is_24_7,
-            'available_agents': len(self.get_available_agents()),
+        # Create all call records at once, before any capacity is reserved
+        call_indexes = [index for indexes in items_by_queue.values() for index in indexes]
+        call_indexes.sort()
+        queue_by_index = {
+            index: queue for queue, indexes in items_by_queue.items() for index in indexes
         }
+        calls = Call.create([{
+            'queue_id': queue_by_index[index].id,
+            'agent_id': assigned.get(index, False),
+            'channel': interactions[index].get('channel', 'voice'),
+            'interaction_type': interactions[index].get('interaction_type', 'inbound'),
+            'caller_number': interactions[index].get('caller_number'),
+            'caller_name': interactions[index].get('caller_name'),
+            'shadow_profile_id': interactions[index].get('shadow_profile_id'),
+            'status': 'ringing' if index in assigned else 'queued',
+        } for index in call_indexes])
+
+        Agent = self.env['cc.agent']
+        chats_by_agent = defaultdict(int)
+        busy_agent_ids = set()
+        for index, agent_id in assigned.items():
+            if interactions[index].get('channel', 'voice') == 'chat':
+                chats_by_agent[agent_id] += 1
+            else:
+                busy_agent_ids.add(agent_id)
+        Agent._reserve_capacity(chats_by_agent, busy_agent_ids)
+
+        agents = Agent.browse(set(assigned.values()))
+        agent_dicts = dict(zip(agents.ids, agents.to_dicts()))
+        for index, call in zip(call_indexes, calls):
+            if index in assigned:
+                results[index] = {
+                    'success': True,
+                    'routed': True,
+                    'queued': False,
+                    'call_id': call.id,
+                    'agent': agent_dicts[assigned[index]],
+                }
+            else:
+                results[index] = {
+                    'success': True,
+                    'routed': False,
+                    'queued': True,
+                    'call_id': call.id,
+                    'message': 'No agents available, call queued',
+                }
+        return results
+
+    @api.model
+    def get_waiting_totals(self):
+        """Count active queues and their waiting calls"""
+        queues = self.search([])
+        return {'total': len(queues), 'total_waiting': sum(queues.mapped('calls_waiting'))}
+
+    # API payload, serialized in bulk by omni.api.mixin
+    _api_fields = {
+        'id': ('id', 'value'),
+        'name': ('name', 'value'),
+        'code': ('code', 'value'),
+        'description': ('description', 'value'),
+        'queue_type': ('queue_type', 'value'),
+        'routing_strategy': ('routing_strategy', 'value'),
+        'priority': ('priority', 'value'),
+        'required_skill_ids': ('required_skill_ids', 'ids'),
+        'required_skills': ('required_skill_ids', 'names'),
+        'team_ids': ('team_ids', 'ids'),
+        'sla_answer_seconds': ('sla_answer_seconds', 'value'),
+        'sla_abandon_seconds': ('sla_abandon_seconds', 'value'),
+        'calls_waiting': ('calls_waiting', 'value'),
+        'avg_wait_time': ('avg_wait_time', 'value'),
+        'avg_handle_time': ('avg_handle_time', 'value'),
+        'wait_time_p50': ('wait_time_p50', 'value'),
+        'wait_time_p90': ('wait_time_p90', 'value'),
+        'handle_time_p50': ('handle_time_p50', 'value'),
+        'handle_time_p90': ('handle_time_p90', 'value'),
+        'is_24_7': ('is_24_7', 'value'),
+        'available_agents': ('available_agent_count', 'value'),
+    }
+    _api_expand = {
+        'required_skills': 'required_skill_ids',
+        'teams': 'team_ids',
+    }
+    # required_skills, team_ids (archived teams left out), available_agent_count
+    # and calls_waiting are read from these
+    _api_depends_tables = (
+        'cc_queue_skill_rel', 'cc_team_queue_rel', 'cc_team', 'cc_queue_agent_eligibility', 'cc_agent',
+        'cc_live_counter',
+    )
@@ -0,0 +1,75 @@
+from odoo import models, fields, api
+
+
+class CCQueueAgentEligibility(models.Model):
+    _name = 'cc.queue.agent.eligibility'
+    _description = 'Contact Center Queue Agent Eligibility'
+    _log_access = False
+
+    # Static part of the routing filter: an agent is eligible for a queue when
+    # it is active, belongs to an active team assigned to the queue, can handle
+    # the queue channel and holds every active required skill. Live status and
+    # chat capacity are checked at routing time.
+    queue_id = fields.Many2one(
+        'cc.queue',
+        string='Queue',
+        required=True,
+        ondelete='cascade'
+    )
+    agent_id = fields.Many2one(
+        'cc.agent',
+        string='Agent',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+
+    _sql_constraints = [
+        ('queue_agent_unique', 'unique(queue_id, agent_id)', 'Agent is already eligible for this queue!'),
+    ]
+
+    def init(self):
+        # Full rebuild on install/upgrade, incremental hooks keep it current afterwards
+        self._refresh()
+
+    @api.model
+    def _refresh(self, queue_ids=None, agent_ids=None):
+        """Recompute eligibility for the given queues and/or agents (everything if none given)"""
+        scope = []
+        params = {}
+        if queue_ids:
+            scope.append("{queue} IN %(queue_ids)s")
+            params['queue_ids'] = tuple(queue_ids)
+        if agent_ids:
+            scope.append("{agent} IN %(agent_ids)s")
+            params['agent_ids'] = tuple(agent_ids)
+        if (queue_ids is not None or agent_ids is not None) and not scope:
+            return
+        scope = ' OR '.join(scope) or 'TRUE'
+
+        self.env.flush_all()
+        cr = self.env.cr
+        cr.execute(
+            "DELETE FROM cc_queue_agent_eligibility WHERE "
+            + scope.format(queue='queue_id', agent='agent_id'),
+            params
+        )
+        cr.execute("""
+            INSERT INTO cc_queue_agent_eligibility (queue_id, agent_id)
+            SELECT q.id, a.id
+              FROM cc_queue q
+              JOIN cc_team_queue_rel tq ON tq.queue_id = q.id
+              JOIN cc_team t ON t.id = tq.team_id AND t.active
+              JOIN cc_agent a ON a.team_id = t.id AND a.active
+             WHERE COALESCE(CASE q.queue_type
+                                WHEN 'voice' THEN a.can_voice
+                                WHEN 'chat' THEN a.can_chat
+                                WHEN 'email' THEN a.can_email
+                                WHEN 'social' THEN a.can_social
+                                ELSE TRUE
+                            END, FALSE)
+               AND a.skill_key @> q.required_skill_key
+               AND ({scope})
+            ON CONFLICT DO NOTHING
+        """.format(scope=scope.format(queue='q.id', agent='a.id')), params)
+        self.env['omni.api.mixin']._api_bump(self._table)
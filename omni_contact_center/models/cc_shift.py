@@ -4,6 +4,7 @@ from odoo.exceptions import ValidationError
 
 class CCShift(models.Model):
     _name = 'cc.shift'
+    _inherit = ['omni.api.mixin']
     _description = 'Contact Center Shift'
     _order = 'date desc, start_time'
 
@@ -99,23 +100,25 @@ class CCShift(models.Model):
         """Cancel the shift"""
         self.write({'status': 'cancelled'})
 
-    def to_dict(self):
-        """Convert to dictionary for API response"""
-        self.ensure_one()
-        return {
-            'id': self.id,
-            'name': self.name,
-            'agent_id': self.agent_id.id,
-            'agent_name': self.agent_id.name,
-            'date': self.date.isoformat() if self.date else None,
-            'start_time': self.start_time,
-            'end_time': self.end_time,
-            'start_time_str': self._float_to_time_str(self.start_time),
-            'end_time_str': self._float_to_time_str(self.end_time),
-            'status': self.status,
-            'actual_start': self.actual_start.isoformat() if self.actual_start else None,
-            'actual_end': self.actual_end.isoformat() if self.actual_end else None,
-            'break_duration': self.break_duration,
-            'break_taken': self.break_taken,
-            'team_id': self.team_id.id if self.team_id else None,
-        }
+    # API payload, serialized in bulk by omni.api.mixin
+    _api_fields = {
+        'id': ('id', 'value'),
+        'name': ('name', 'value'),
+        'agent_id': ('agent_id', 'id'),
+        'agent_name': ('agent_id', 'name'),
+        'date': ('date', 'date'),
+        'start_time': ('start_time', 'value'),
+        'end_time': ('end_time', 'value'),
+        'start_time_str': ('start_time', '_float_to_time_str'),
+        'end_time_str': ('end_time', '_float_to_time_str'),
+        'status': ('status', 'value'),
+        'actual_start': ('actual_start', 'datetime'),
+        'actual_end': ('actual_end', 'datetime'),
+        'break_duration': ('break_duration', 'value'),
+        'break_taken': ('break_taken', 'value'),
+        'team_id': ('team_id', 'id'),
+    }
+    _api_expand = {
+        'agent': 'agent_id',
+        'team': 'team_id',
+    }
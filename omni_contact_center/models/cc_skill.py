@@ -3,6 +3,7 @@ from odoo import models, fields, api
 
 class CCSkill(models.Model):
     _name = 'cc.skill'
+    _inherit = ['omni.api.mixin']
     _description = 'Contact Center Skill'
     _order = 'name'
 
@@ -38,19 +39,61 @@ class CCSkill(models.Model):
         ('code_unique', 'unique(code)', 'Skill code must be unique!'),
     ]
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        skills = super().create(vals_list)
+        skills._sync_skill_keys(
+            skills.with_context(active_test=False).agent_ids, skills._get_requiring_queue_ids()
+        )
+        return skills
+
+    def write(self, vals):
+        if not {'active', 'agent_ids'}.intersection(vals):
+            return super().write(vals)
+        agents = self.with_context(active_test=False).agent_ids
+        res = super().write(vals)
+        agents |= self.with_context(active_test=False).agent_ids
+        self._sync_skill_keys(agents, self._get_requiring_queue_ids())
+        return res
+
+    def unlink(self):
+        agents = self.with_context(active_test=False).agent_ids
+        queue_ids = self._get_requiring_queue_ids()
+        res = super().unlink()
+        self._sync_skill_keys(agents, queue_ids)
+        return res
+
+    @api.model
+    def _sync_skill_keys(self, agents, queue_ids):
+        """Propagate a skill change to agent/queue skill keys and their eligibility"""
+        agents._sync_skill_key()
+        self.env['cc.queue'].browse(queue_ids)._sync_required_skill_key()
+        self.env['cc.queue.agent.eligibility']._refresh(queue_ids=queue_ids, agent_ids=agents.ids)
+
+    def _get_requiring_queue_ids(self):
+        """Get ids of all queues (archived included) requiring one of these skills"""
+        if not self:
+            return []
+        self.env.cr.execute(
+            "SELECT DISTINCT queue_id FROM cc_queue_skill_rel WHERE skill_id IN %s",
+            [tuple(self.ids)]
+        )
+        return [row[0] for row in self.env.cr.fetchall()]
+
     @api.depends('agent_ids')
     def _compute_agent_count(self):
         for record in self:
             record.agent_count = len(record.agent_ids)
 
-    def to_dict(self):
-        """Convert to dictionary for API response"""
-        self.ensure_one()
-        return {
-            'id': self.id,
-            'name': self.name,
-            'code': self.code,
-            'skill_type': self.skill_type,
-            'description': self.description,
-            'agent_count': self.agent_count,
-        }
+    # API payload, serialized in bulk by omni.api.mixin
+    _api_fields = {
+        'id': ('id', 'value'),
+        'name': ('name', 'value'),
+        'code': ('code', 'value'),
+        'skill_type': ('skill_type', 'value'),
+        'description': ('description', 'value'),
+        'agent_count': ('agent_count', 'value'),
+    }
+    # agent_count is read from the agent/skill relation and, as archived
+    # agents are not counted, from the agents themselves
+    _api_depends_tables = ('cc_agent_skill_rel', 'cc_agent')
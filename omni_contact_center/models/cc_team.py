@@ -3,6 +3,7 @@ from odoo import models, fields, api
 
 class CCTeam(models.Model):
     _name = 'cc.team'
+    _inherit = ['omni.api.mixin']
     _description = 'Contact Center Team'
     _order = 'name'
 
@@ -49,6 +50,30 @@ class CCTeam(models.Model):
         ('code_unique', 'unique(code)', 'Team code must be unique!'),
     ]
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        teams = super().create(vals_list)
+        # Agents linked on create may be written before the queue relation exists
+        agents = teams.with_context(active_test=False).agent_ids
+        self.env['cc.queue.agent.eligibility']._refresh(agent_ids=agents.ids)
+        return teams
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {'active', 'queue_ids'}.intersection(vals):
+            agents = self.with_context(active_test=False).agent_ids
+            self.env['cc.queue.agent.eligibility']._refresh(agent_ids=agents.ids)
+        return res
+
+    def unlink(self):
+        # Agents lose their team through the database ON DELETE SET NULL
+        agents = self.with_context(active_test=False).agent_ids
+        team_ids = self.ids
+        res = super().unlink()
+        self.env['cc.queue.agent.eligibility']._refresh(agent_ids=agents.ids)
+        self.env['cc.live.counter']._move_scope('agent', team_ids)
+        return res
+
     @api.depends('agent_ids')
     def _compute_agent_count(self):
         for record in self:
@@ -61,17 +86,22 @@ class CCTeam(models.Model):
                 record.agent_ids.filtered(lambda a: a.status == 'available')
             )
 
-    def to_dict(self):
-        """Convert to dictionary for API response"""
-        self.ensure_one()
-        return {
-            'id': self.id,
-            'name': self.name,
-            'code': self.code,
-            'description': self.description,
-            'leader_id': self.leader_id.id if self.leader_id else None,
-            'leader_name': self.leader_id.name if self.leader_id else None,
-            'agent_count': self.agent_count,
-            'available_agent_count': self.available_agent_count,
-            'queue_ids': self.queue_ids.ids,
-        }
+    # API payload, serialized in bulk by omni.api.mixin
+    _api_fields = {
+        'id': ('id', 'value'),
+        'name': ('name', 'value'),
+        'code': ('code', 'value'),
+        'description': ('description', 'value'),
+        'leader_id': ('leader_id', 'id'),
+        'leader_name': ('leader_id', 'name'),
+        'agent_count': ('agent_count', 'value'),
+        'available_agent_count': ('available_agent_count', 'value'),
+        'queue_ids': ('queue_ids', 'ids'),
+    }
+    _api_expand = {
+        'leader': 'leader_id',
+        'queues': 'queue_ids',
+    }
+    # queue_ids and the agent counts are read from these, archived queues
+    # and agents are left out
+    _api_depends_tables = ('cc_team_queue_rel', 'cc_queue', 'cc_agent')
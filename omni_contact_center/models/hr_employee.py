@@ -0,0 +1,18 @@
+from odoo import models
+
+
+class HrEmployee(models.Model):
+    _inherit = 'hr.employee'
+
+    # Agent names are read from employees, API payloads naming agents are
+    # versioned on this table
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env['omni.api.mixin']._api_bump(self._table)
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env['omni.api.mixin']._api_bump(self._table)
+        return res
@@ -0,0 +1,140 @@
+import threading
+from collections import Counter
+
+from odoo import SUPERUSER_ID, api
+from odoo.addons.shadow_profiles.tools.api_errors import CONCURRENCY_ERRORS
+from odoo.modules.registry import Registry
+from odoo.tests.common import BaseCase, get_db_name, tagged
+
+THREADS = 8
+AGENTS = 5
+MAX_TRIES = 10
+
+
+@tagged('post_install', '-at_install')
+class TestClaimAgentConcurrency(BaseCase):
+    """Concurrent claim_agent calls, each in its own committed transaction"""
+
+    def setUp(self):
+        super().setUp()
+        self.registry = Registry(get_db_name())
+
+    def _setup_queue(self, queue_type, max_chats=1):
+        """Commit a queue served by AGENTS available agents, cleaned up after the test"""
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            code = f'TEST_CLAIM_{queue_type.upper()}'
+            queue = env['cc.queue'].create({
+                'name': code,
+                'code': code,
+                'queue_type': queue_type,
+                'routing_strategy': 'least_busy',
+            })
+            team = env['cc.team'].create({'name': code, 'queue_ids': [(6, 0, queue.ids)]})
+            agents = env['cc.agent'].create([{
+                'name': f'{code} Agent {index}',
+                'team_id': team.id,
+                'status': 'available',
+                'max_concurrent_chats': max_chats,
+            } for index in range(AGENTS)])
+            ids = queue.id, team.id, agents.ids, agents.employee_id.ids
+        self.addCleanup(self._cleanup, *ids)
+        return ids[0], ids[2]
+
+    def _cleanup(self, queue_id, team_id, agent_ids, employee_ids):
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env['cc.agent'].browse(agent_ids).unlink()
+            env['hr.employee'].browse(employee_ids).unlink()
+            env['cc.team'].browse(team_id).unlink()
+            env['cc.queue'].browse(queue_id).unlink()
+
+    def _claim(self, queue_id, channel):
+        """Claim an agent in a new transaction, retried on conflicts like an HTTP request"""
+        for _attempt in range(MAX_TRIES):
+            try:
+                with self.registry.cursor() as cr:
+                    env = api.Environment(cr, SUPERUSER_ID, {})
+                    agent = env['cc.queue'].browse(queue_id).claim_agent(channel)
+                    return agent.id if agent else None
+            except CONCURRENCY_ERRORS:
+                continue
+        raise AssertionError('claim_agent kept conflicting')
+
+    def _claim_concurrently(self, queue_id, channel, claims_per_thread):
+        """Run THREADS threads of claims started together, return the claimed agent ids"""
+        barrier = threading.Barrier(THREADS)
+        claimed = []
+        failures = []
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                barrier.wait()
+                for _claim in range(claims_per_thread):
+                    agent_id = self._claim(queue_id, channel)
+                    with lock:
+                        claimed.append(agent_id)
+            except Exception as e:
+                # Reported by the main thread
+                with lock:
+                    failures.append(e)
+
+        threads = [threading.Thread(target=worker) for _thread in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertFalse(failures, failures)
+        return [agent_id for agent_id in claimed if agent_id]
+
+    def _claim_remaining(self, queue_id, channel):
+        """Claim sequentially until no agent is left, return the claimed agent ids"""
+        claimed = []
+        while agent_id := self._claim(queue_id, channel):
+            claimed.append(agent_id)
+            self.assertLessEqual(len(claimed), AGENTS * 10, "claims should run out")
+        return claimed
+
+    def _agent_state(self, agent_ids):
+        with self.registry.cursor() as cr:
+            cr.execute(
+                "SELECT id, status, current_chats, max_concurrent_chats FROM cc_agent WHERE id IN %s",
+                [tuple(agent_ids)]
+            )
+            return {row[0]: row[1:] for row in cr.fetchall()}
+
+    def test_voice_agent_claimed_at_most_once(self):
+        queue_id, agent_ids = self._setup_queue('voice')
+        claimed = self._claim_concurrently(queue_id, 'voice', claims_per_thread=2)
+
+        counts = Counter(claimed)
+        self.assertLessEqual(set(counts), set(agent_ids))
+        self.assertTrue(all(count == 1 for count in counts.values()), counts)
+
+        # Whatever a concurrent claim missed is still claimable, exactly once
+        counts.update(self._claim_remaining(queue_id, 'voice'))
+        self.assertEqual(set(counts), set(agent_ids), "every agent should be claimed")
+        self.assertTrue(all(count == 1 for count in counts.values()), counts)
+        statuses = {status for status, *_chats in self._agent_state(agent_ids).values()}
+        self.assertEqual(statuses, {'busy'})
+
+    def test_chat_capacity_never_exceeded(self):
+        max_chats = 3
+        queue_id, agent_ids = self._setup_queue('chat', max_chats=max_chats)
+        claimed = self._claim_concurrently(queue_id, 'chat', claims_per_thread=3)
+
+        counts = Counter(claimed)
+        self.assertLessEqual(len(claimed), AGENTS * max_chats, "no claim beyond capacity")
+        for agent_id, (status, current_chats, max_concurrent) in self._agent_state(agent_ids).items():
+            self.assertLessEqual(counts[agent_id], max_chats)
+            self.assertEqual(current_chats, counts[agent_id])
+            self.assertLessEqual(current_chats, max_concurrent)
+
+        # Saturation is only guaranteed once the leftovers are claimed one by one
+        counts.update(self._claim_remaining(queue_id, 'chat'))
+        self.assertEqual(sum(counts.values()), AGENTS * max_chats, "all capacity should be handed out")
+        for agent_id, (status, current_chats, max_concurrent) in self._agent_state(agent_ids).items():
+            self.assertEqual(current_chats, counts[agent_id])
+            self.assertEqual(current_chats, max_concurrent)
+            self.assertEqual(status, 'busy')
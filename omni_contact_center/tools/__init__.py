@@ -0,0 +1 @@
+from . import route_trace
@@ -0,0 +1,100 @@
+"""Sampled routing decision traces.
+
+Traces are kept in a bounded in-process ring buffer, so each worker process
+only sees the routes it served itself. Sampling is controlled by the
+``omni_contact_center.route_trace_sample_rate`` system parameter (0 to 1,
+default 0); a caller can also force tracing of a single route.
+"""
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+SAMPLE_RATE_PARAM = 'omni_contact_center.route_trace_sample_rate'
+BUFFER_SIZE = 500
+
+_buffer = deque(maxlen=BUFFER_SIZE)
+_buffer_lock = threading.Lock()
+
+
+class RouteTracer:
+    """Collect per stage timings, SQL query counts and details of one route"""
+
+    enabled = True
+
+    def __init__(self, cr, **info):
+        self.cr = cr
+        self.id = uuid.uuid4().hex
+        self.info = dict(info)
+        self.stages = []
+        self._start = time.perf_counter()
+        self._start_queries = cr.sql_log_count
+
+    @contextmanager
+    def stage(self, name, **details):
+        """Time a stage, the yielded dict can be filled with stage details"""
+        entry = dict(stage=name, **details)
+        start = time.perf_counter()
+        queries = self.cr.sql_log_count
+        try:
+            yield entry
+        finally:
+            entry['duration_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            entry['queries'] = self.cr.sql_log_count - queries
+            self.stages.append(entry)
+
+    def set(self, **info):
+        self.info.update(info)
+
+    def finish(self, **info):
+        """Store the trace in the ring buffer"""
+        self.info.update(info)
+        trace = {
+            'id': self.id,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'duration_ms': round((time.perf_counter() - self._start) * 1000, 3),
+            'queries': self.cr.sql_log_count - self._start_queries,
+            **self.info,
+            'stages': self.stages,
+        }
+        with _buffer_lock:
+            _buffer.append(trace)
+        return trace
+
+
+class NullTracer:
+    """Tracer used for unsampled routes, every call is a no-op"""
+
+    enabled = False
+    id = None
+
+    def stage(self, name, **details):
+        return nullcontext({})
+
+    def set(self, **info):
+        pass
+
+    def finish(self, **info):
+        return None
+
+
+NULL_TRACER = NullTracer()
+
+
+def start_trace(env, force=False, **info):
+    """Return a RouteTracer for sampled (or forced) routes, NULL_TRACER otherwise"""
+    if not force:
+        rate = float(env['ir.config_parameter'].sudo().get_param(SAMPLE_RATE_PARAM, 0) or 0)
+        if rate <= 0 or random.random() >= rate:
+            return NULL_TRACER
+    return RouteTracer(env.cr, **info)
+
+
+def get_traces(limit=None):
+    """Return buffered traces, newest first"""
+    with _buffer_lock:
+        traces = list(_buffer)
+    traces.reverse()
+    return traces[:limit] if limit else traces
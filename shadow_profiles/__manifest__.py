@@ -31,8 +31,10 @@
         - GET/PUT/DELETE /api/v1/shadow/<id>
         - GET /api/v1/shadow/search
         - POST /api/v1/shadow/find-or-create
+        - POST /api/v1/shadow/ingest
         - POST /api/v1/shadow/<id>/qualify
         - POST /api/v1/shadow/<id>/convert
+        - GET /api/v1/shadow/conversations/export
         - GET /api/v1/shadow/stats
     """,
     'author': 'Omnichannel Team',
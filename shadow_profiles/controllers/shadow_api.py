@@ -2,6 +2,11 @@ import json
 from odoo import http
 from odoo.http import request, Response
 
+from ..models.shadow_profile import IDENTITY_FIELDS
+from ..tools.api_errors import CONCURRENCY_ERRORS
+from ..tools.api_params import add_total, parse_datetimes, serialize_options
+from ..tools.export_stream import EXPORT_FORMATS, stream_export
+
 
 class ShadowProfileAPI(http.Controller):
     """REST API for Shadow Profiles - Used by N8N"""
@@ -47,20 +52,25 @@ class ShadowProfileAPI(http.Controller):
                 domain.append(('is_converted', '=', kwargs['is_converted'] == 'true'))
 
             # Pagination
+            Shadow = request.env['shadow.profile'].sudo()
             limit = int(kwargs.get('limit', 100))
-            offset = int(kwargs.get('offset', 0))
-
-            shadows = request.env['shadow.profile'].sudo().search(
-                domain, limit=limit, offset=offset, order='last_contact_date desc'
-            )
-            total = request.env['shadow.profile'].sudo().search_count(domain)
-
-            return self._success_response({
-                'records': [s.to_dict() for s in shadows],
-                'total': total,
-                'limit': limit,
-                'offset': offset
-            })
+            result = {'limit': limit}
+
+            if 'offset' in kwargs:
+                # Legacy offset paging, counted unless count=none
+                offset = int(kwargs['offset'])
+                shadows = Shadow.search(domain, limit=limit, offset=offset, order='last_contact_date desc')
+                result['offset'] = offset
+            else:
+                shadows, result['next_cursor'] = Shadow._api_search_page(
+                    domain, cursor=kwargs.get('cursor'), limit=limit
+                )
+
+            result['records'] = shadows.to_dicts(**serialize_options(kwargs))
+            add_total(result, Shadow, domain, kwargs, 'exact' if 'offset' in kwargs else 'none')
+            return self._success_response(result)
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return self._error_response(str(e), 500)
 
@@ -71,7 +81,9 @@ class ShadowProfileAPI(http.Controller):
             shadow = request.env['shadow.profile'].sudo().browse(shadow_id)
             if not shadow.exists():
                 return self._error_response('Shadow profile not found', 404)
-            return self._success_response(shadow.to_dict())
+            return self._success_response(shadow.to_dict(**serialize_options(kwargs)))
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return self._error_response(str(e), 500)
 
@@ -87,6 +99,8 @@ class ShadowProfileAPI(http.Controller):
 
             shadow = request.env['shadow.profile'].sudo().create(data)
             return {'success': True, 'data': shadow.to_dict()}
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
@@ -101,6 +115,8 @@ class ShadowProfileAPI(http.Controller):
             data = request.jsonrequest
             shadow.write(data)
             return {'success': True, 'data': shadow.to_dict()}
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
@@ -113,6 +129,8 @@ class ShadowProfileAPI(http.Controller):
                 return self._error_response('Shadow profile not found', 404)
             shadow.unlink()
             return self._success_response(message='Shadow profile deleted')
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return self._error_response(str(e), 500)
 
@@ -120,29 +138,25 @@ class ShadowProfileAPI(http.Controller):
 
     @http.route('/api/v1/shadow/search', type='http', auth='api_key', methods=['GET'], csrf=False)
     def search_shadow(self, **kwargs):
-        """Search shadow by phone, social ID, or email"""
+        """Search shadow by phone, social ID, email or platform + external_id"""
         try:
             Shadow = request.env['shadow.profile'].sudo()
             shadow = None
 
-            if kwargs.get('phone'):
-                shadow = Shadow.search([('phone', '=', kwargs['phone'])], limit=1)
-            elif kwargs.get('whatsapp_id'):
-                shadow = Shadow.search([('whatsapp_id', '=', kwargs['whatsapp_id'])], limit=1)
-            elif kwargs.get('facebook_id'):
-                shadow = Shadow.search([('facebook_id', '=', kwargs['facebook_id'])], limit=1)
-            elif kwargs.get('instagram_id'):
-                shadow = Shadow.search([('instagram_id', '=', kwargs['instagram_id'])], limit=1)
-            elif kwargs.get('telegram_id'):
-                shadow = Shadow.search([('telegram_id', '=', kwargs['telegram_id'])], limit=1)
-            elif kwargs.get('email'):
-                shadow = Shadow.search([('email', '=', kwargs['email'])], limit=1)
+            # One identity index probe, parameters checked in IDENTITY_FIELDS order
+            platform = next((p for p, field in IDENTITY_FIELDS.items() if kwargs.get(field)), None)
+            if platform:
+                shadow = Shadow.search_by_identity(platform, kwargs[IDENTITY_FIELDS[platform]])
+            elif kwargs.get('platform') and kwargs.get('external_id'):
+                shadow = Shadow.search_by_identity(kwargs['platform'], kwargs['external_id'])
             elif kwargs.get('identifier'):
                 shadow = Shadow.search_by_identifier(kwargs['identifier'])
 
             if shadow:
-                return self._success_response(shadow.to_dict())
+                return self._success_response(shadow.to_dict(**serialize_options(kwargs)))
             return self._success_response(None)
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return self._error_response(str(e), 500)
 
@@ -164,6 +178,33 @@ class ShadowProfileAPI(http.Controller):
             if shadow:
                 return {'success': True, 'data': shadow.to_dict()}
             return {'success': False, 'error': 'Invalid platform'}
+        except CONCURRENCY_ERRORS:
+            raise
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    @http.route('/api/v1/shadow/ingest', type='json', auth='api_key', methods=['POST'], csrf=False)
+    def ingest_messages(self, **kwargs):
+        """Record a batch of channel messages, finding or creating their profiles"""
+        try:
+            data = request.jsonrequest
+            events = data.get('events')
+            if not isinstance(events, list) or not events:
+                return {'success': False, 'error': 'events must be a non-empty list'}
+
+            # A failure half way through leaves no profiles or messages behind
+            with request.env.cr.savepoint():
+                results, errors = request.env['shadow.conversation'].sudo().ingest(events)
+            return {
+                'success': True,
+                'data': {
+                    'ingested': len(results),
+                    'records': results,
+                    'errors': errors,
+                }
+            }
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
@@ -178,6 +219,8 @@ class ShadowProfileAPI(http.Controller):
                 return {'success': False, 'error': 'Shadow profile not found'}
             shadow.action_qualify()
             return {'success': True, 'data': shadow.to_dict()}
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
@@ -196,6 +239,8 @@ class ShadowProfileAPI(http.Controller):
                     'partner_id': partner.id
                 }
             }
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
@@ -203,22 +248,72 @@ class ShadowProfileAPI(http.Controller):
 
     @http.route('/api/v1/shadow/<int:shadow_id>/conversations', type='http', auth='api_key', methods=['GET'], csrf=False)
     def get_conversations(self, shadow_id, **kwargs):
-        """Get conversations for a shadow profile"""
+        """Get conversations for a shadow profile, newest first
+
+        Pages with before=<next_cursor> (older messages) or after=<cursor>
+        (newer messages), each page is a range scan of the (profile, timestamp
+        desc nulls last, id desc) index, forward or backward.
+        """
         try:
             shadow = request.env['shadow.profile'].sudo().browse(shadow_id)
             if not shadow.exists():
                 return self._error_response('Shadow profile not found', 404)
+            if kwargs.get('before') and kwargs.get('after'):
+                return self._error_response('before and after are exclusive')
 
-            conversations = [{
-                'id': c.id,
-                'channel': c.channel,
-                'message': c.message,
-                'direction': c.direction,
-                'timestamp': c.timestamp.isoformat() if c.timestamp else None,
-                'is_ai_response': c.is_ai_response,
-            } for c in shadow.conversation_ids]
+            limit = int(kwargs.get('limit', 100))
+            after = bool(kwargs.get('after'))
+            Conversation = request.env['shadow.conversation'].sudo()
+            conversations, next_cursor = Conversation._api_search_page(
+                [('shadow_profile_id', '=', shadow.id)],
+                cursor=kwargs.get('after') or kwargs.get('before'),
+                limit=limit,
+                reverse=after,
+            )
+            if after:
+                conversations = conversations[::-1]
 
-            return self._success_response(conversations)
+            newest = conversations[:1]
+            return self._success_response({
+                'limit': limit,
+                'next_cursor': next_cursor,
+                # Poll for newer messages with after=<newest_cursor>
+                'newest_cursor': Conversation._api_encode_cursor(newest.timestamp, newest.id) if newest else None,
+                'records': conversations.to_dicts(**serialize_options(kwargs)),
+            })
+        except CONCURRENCY_ERRORS:
+            raise
+        except Exception as e:
+            return self._error_response(str(e), 500)
+
+    @http.route('/api/v1/shadow/conversations/export', type='http', auth='api_key', methods=['GET'], csrf=False)
+    def export_conversations(self, **kwargs):
+        """Stream the conversation history as NDJSON (default) or CSV"""
+        try:
+            fmt = kwargs.get('format', 'ndjson')
+            if fmt not in EXPORT_FORMATS:
+                return self._error_response('format must be ndjson or csv')
+            try:
+                dates = parse_datetimes(kwargs, 'date_from', 'date_to')
+            except ValueError as e:
+                return self._error_response(str(e))
+
+            columns, query = request.env['shadow.conversation'].sudo()._export_query(
+                date_from=dates.get('date_from'),
+                date_to=dates.get('date_to'),
+                shadow_profile_id=kwargs.get('shadow_id'),
+                channel=kwargs.get('channel'),
+                direction=kwargs.get('direction'),
+            )
+            mimetype, extension = EXPORT_FORMATS[fmt]
+            return Response(
+                stream_export(request.env.registry, query, columns, fmt),
+                mimetype=mimetype,
+                headers=[('Content-Disposition', f'attachment; filename=conversations.{extension}')],
+                direct_passthrough=True,
+            )
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return self._error_response(str(e), 500)
 
@@ -232,14 +327,9 @@ class ShadowProfileAPI(http.Controller):
                 if not data.get(field):
                     return {'success': False, 'error': f'{field} is required'}
 
+            # Also adds the message to the profile's message_count and last_contact_date
             conversation = request.env['shadow.conversation'].sudo().create(data)
-
-            # Update message count
             shadow = conversation.shadow_profile_id
-            shadow.sudo().write({
-                'message_count': shadow.message_count + 1,
-                'last_contact_date': conversation.timestamp
-            })
 
             return {
                 'success': True,
@@ -249,6 +339,8 @@ class ShadowProfileAPI(http.Controller):
                     'message_count': shadow.message_count
                 }
             }
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
@@ -258,24 +350,12 @@ class ShadowProfileAPI(http.Controller):
     def get_stats(self, **kwargs):
         """Get shadow profile statistics"""
         try:
-            Shadow = request.env['shadow.profile'].sudo()
-
-            stats = {
-                'total': Shadow.search_count([]),
-                'anonymous': Shadow.search_count([('status', '=', 'anonymous')]),
-                'qualified': Shadow.search_count([('status', '=', 'qualified')]),
-                'pending_registration': Shadow.search_count([('status', '=', 'pending_registration')]),
-                'registered': Shadow.search_count([('status', '=', 'registered')]),
-                'converted': Shadow.search_count([('is_converted', '=', True)]),
-                'by_channel': {
-                    'whatsapp': Shadow.search_count([('source_channel', '=', 'whatsapp')]),
-                    'facebook': Shadow.search_count([('source_channel', '=', 'facebook')]),
-                    'instagram': Shadow.search_count([('source_channel', '=', 'instagram')]),
-                    'telegram': Shadow.search_count([('source_channel', '=', 'telegram')]),
-                    'phone': Shadow.search_count([('source_channel', '=', 'phone')]),
-                    'website': Shadow.search_count([('source_channel', '=', 'website')]),
-                }
-            }
+            stats = request.env['shadow.profile'].sudo().get_stats(
+                date_from=kwargs.get('date_from'),
+                date_to=kwargs.get('date_to'),
+            )
             return self._success_response(stats)
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             return self._error_response(str(e), 500)
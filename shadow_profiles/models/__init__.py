@@ -1,2 +1,4 @@
+from . import omni_api_mixin
 from . import shadow_profile
 from . import shadow_conversation
+from . import shadow_profile_identity
@@ -0,0 +1,323 @@
+import base64
+import json
+from datetime import datetime
+
+from odoo import api, models
+from odoo.tools import SQL
+
+# Below this planner estimate a count is cheap, so the exact value is returned
+EXACT_COUNT_THRESHOLD = 10000
+
+
+def generation_sequence(table):
+    """Name of the sequence counting the committed changes of ``table``"""
+    return f'{table}_api_generation'
+
+
+def model_tables(model):
+    """Tables a record of ``model`` is read from: its own and its _inherits parents'"""
+    return {model._table, *(model.env[parent]._table for parent in model._inherits)}
+
+
+class OmniApiMixin(models.AbstractModel):
+    """Bulk serialization of recordsets for the REST API
+
+    Models list their API payload in ``_api_fields``, an ordered mapping of
+    output key -> (field name, kind). Kinds:
+
+    - ``value``: field value as read
+    - ``id`` / ``name``: many2one id / display name, None when empty
+    - ``ids`` / ``names``: x2many ids / names
+    - ``datetime`` / ``date``: ISO format, None when empty
+    - any other kind names a model method formatting the value
+
+    ``_api_expand`` maps expandable relation names to relational fields, an
+    expanded relation is embedded as the related records' own payload.
+
+    ``_api_keyset`` names the datetime field of keyset pagination, pages are
+    ordered by (field desc nulls last, id desc).
+
+    ``_api_depends_tables`` lists the tables, besides the model's own, that
+    payload values are computed from; together with the tables of named and
+    expanded relations they make up the payload version (see _api_version).
+    ORM writes of these models bump the generation of their tables, raw SQL
+    writers call ``_api_bump`` themselves.
+    """
+    _name = 'omni.api.mixin'
+    _description = 'API Serialization Mixin'
+
+    _api_fields = {}
+    _api_expand = {}
+    _api_keyset = None
+    _api_depends_tables = ()
+
+    def init(self):
+        for table in sorted(self._api_version_tables(expand=self._api_expand)):
+            self.env.cr.execute(SQL("CREATE SEQUENCE IF NOT EXISTS %s", SQL.identifier(generation_sequence(table))))
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._api_bump_written({name for vals in vals_list for name in vals})
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        self._api_bump_written(vals)
+        return res
+
+    def unlink(self):
+        tables = self._api_written_tables(self._fields)
+        res = super().unlink()
+        self._api_bump(*tables)
+        return res
+
+    def to_dicts(self, fields=None, expand=None):
+        """Serialize the recordset with one read() plus one name read per comodel
+
+        :param fields: payload keys to return (all when empty), ``id`` is always returned
+        :param expand: names of ``_api_expand`` relations to embed
+        """
+        if not self:
+            return []
+        spec = self._api_fields
+        if fields:
+            spec = {key: value for key, value in spec.items() if key == 'id' or key in fields}
+        expand = [name for name in self._api_expand if expand and name in expand]
+
+        columns = list(dict.fromkeys(
+            [field for field, kind in spec.values() if field != 'id']
+            + [self._api_expand[name] for name in expand]
+        ))
+        rows = self.read(columns, load=None)
+        names = self._api_read_names(rows, spec)
+        expanded = {name: self._api_read_expanded(rows, self._api_expand[name]) for name in expand}
+
+        result = []
+        for row in rows:
+            data = {}
+            for key, (field, kind) in spec.items():
+                value = row[field]
+                if kind == 'id':
+                    value = value or None
+                elif kind == 'name':
+                    value = names[self._fields[field].comodel_name].get(value) if value else None
+                elif kind == 'names':
+                    comodel_names = names[self._fields[field].comodel_name]
+                    value = [comodel_names[rid] for rid in value]
+                elif kind in ('datetime', 'date'):
+                    value = value.isoformat() if value else None
+                elif kind not in ('value', 'ids'):
+                    value = getattr(self, kind)(value)
+                data[key] = value
+            for name, records in expanded.items():
+                value = row[self._api_expand[name]]
+                if isinstance(value, list):
+                    data[name] = [records[rid] for rid in value]
+                else:
+                    data[name] = records.get(value) if value else None
+            result.append(data)
+        return result
+
+    def to_dict(self, fields=None, expand=None):
+        """Convert to dictionary for API response"""
+        self.ensure_one()
+        return self.to_dicts(fields=fields, expand=expand)[0]
+
+    def _api_read_expanded(self, rows, field):
+        """Serialize the records related through ``field``, keyed by id"""
+        ids = set()
+        for row in rows:
+            value = row[field]
+            if isinstance(value, list):
+                ids.update(value)
+            elif value:
+                ids.add(value)
+        records = self.env[self._fields[field].comodel_name].browse(ids)
+        return {data['id']: data for data in records.to_dicts()}
+
+    def _api_read_names(self, rows, spec):
+        """Resolve display names of related records, one query per comodel"""
+        ids_by_model = {}
+        for field, kind in spec.values():
+            if kind not in ('name', 'names'):
+                continue
+            ids = ids_by_model.setdefault(self._fields[field].comodel_name, set())
+            for row in rows:
+                value = row[field]
+                if kind == 'name':
+                    if value:
+                        ids.add(value)
+                else:
+                    ids.update(value)
+
+        names = {}
+        for model_name, ids in ids_by_model.items():
+            Comodel = self.env[model_name].with_context(active_test=False)
+            rec_name = Comodel._rec_name or 'id'
+            names[model_name] = {
+                r['id']: r[rec_name] for r in Comodel.browse(ids).read([rec_name])
+            }
+        return names
+
+    # Versioning
+
+    @api.model
+    def _api_version(self, expand=None):
+        """Version stamp of the API payload, changes whenever a table it is built from changes
+
+        Made of the generations of the tables, read from their sequences in
+        one catalog query; no table is scanned and no record is loaded.
+        """
+        tables = sorted(self._api_version_tables(expand))
+        self.env.cr.execute("""
+            SELECT sequencename, last_value
+              FROM pg_sequences
+             WHERE schemaname = current_schema() AND sequencename IN %s
+        """, [tuple(generation_sequence(table) for table in tables)])
+        generations = dict(self.env.cr.fetchall())
+        return tuple((table, generations.get(generation_sequence(table)) or 0) for table in tables)
+
+    @api.model
+    def _api_version_tables(self, expand=None):
+        """Tables the payload is read from, with the given relations expanded"""
+        tables = model_tables(self) | set(self._api_depends_tables)
+        for field, kind in self._api_fields.values():
+            if kind in ('name', 'names'):
+                tables |= model_tables(self.env[self._fields[field].comodel_name])
+        for name, field in self._api_expand.items():
+            if expand and name in expand:
+                tables.update(self.env[self._fields[field].comodel_name]._api_version_tables())
+        return tables
+
+    def _api_written_tables(self, field_names):
+        """Tables changed by writing ``field_names``: the model's and those of many2many relations"""
+        tables = {self._table}
+        for name in field_names:
+            field = self._fields.get(name)
+            if field and field.type == 'many2many' and field.store:
+                tables.add(field.relation)
+        return tables
+
+    def _api_bump_written(self, field_names):
+        self._api_bump(*self._api_written_tables(field_names))
+
+    @api.model
+    def _api_bump(self, *tables):
+        """Advance the generation of ``tables`` once the current transaction commits
+
+        Bumping after the commit means a version read can never be newer than
+        the data it describes, so a response is never cached under a version
+        it does not match. Tables nothing is versioned on have no sequence
+        and are ignored.
+        """
+        cr = self.env.cr
+        pending = cr.postcommit.data.get('omni_api_generation')
+        if pending is None:
+            pending = cr.postcommit.data['omni_api_generation'] = set()
+
+            def bump():
+                # Sequences are not transactional, nothing to commit
+                cr.execute("""
+                    SELECT nextval(to_regclass(name))
+                      FROM unnest(%s::text[]) AS name
+                     WHERE to_regclass(name) IS NOT NULL
+                """, [[generation_sequence(table) for table in sorted(pending)]])
+            cr.postcommit.add(bump)
+        pending.update(tables)
+
+    # Totals
+
+    @api.model
+    def _api_count(self, domain, mode='exact'):
+        """Count records for a list response, return (total, is_estimate)
+
+        :param mode: ``exact``, ``estimate`` (planner row estimate, exact when
+            the estimate is small) or ``none``
+        """
+        if mode == 'none':
+            return None, False
+        if mode == 'estimate':
+            query = self._search(domain)
+            self.env.cr.execute(SQL("EXPLAIN (FORMAT JSON) %s", query.select()))
+            estimate = int(self.env.cr.fetchone()[0][0]['Plan']['Plan Rows'])
+            if estimate >= EXACT_COUNT_THRESHOLD:
+                return estimate, True
+        elif mode != 'exact':
+            raise ValueError("count must be one of exact, estimate, none")
+        return self.search_count(domain), False
+
+    # Keyset pagination
+
+    @api.model
+    def _api_page_segments(self, cursor=None, reverse=False):
+        """Return the (condition, order) of the queries walking a page after ``cursor``
+
+        Records with a key are walked with the row comparison
+        ``(key, id) < (value, id)``, records without one form a tail bounded
+        by id. Both segments are ordered exactly like the keyset index, (key
+        desc nulls last, id desc) or its backward scan (key asc nulls first,
+        id asc) with ``reverse``, so each is an index range scan with no sort.
+        """
+        key = SQL.identifier(self._table, self._api_keyset)
+        record_id = SQL.identifier(self._table, 'id')
+        value, last_id = self._api_decode_cursor(cursor) if cursor else (None, None)
+        in_tail = bool(cursor) and value is None
+        operator = SQL('>' if reverse else '<')
+
+        keyed = (
+            SQL("(%s, %s) %s (%s, %s)", key, record_id, operator, value, last_id)
+            if value else SQL("%s IS NOT NULL", key)
+        )
+        tail = SQL("%s IS NULL", key)
+        if in_tail:
+            tail = SQL("%s AND %s %s %s", tail, record_id, operator, last_id)
+        if reverse:
+            order = f'{self._api_keyset} asc nulls first, id asc'
+            segments = [(keyed, order)]
+            if not value:
+                segments.insert(0, (tail, order))
+        else:
+            order = f'{self._api_keyset} desc nulls last, id desc'
+            segments = [(tail, order)]
+            if not in_tail:
+                segments.insert(0, (keyed, order))
+        return segments
+
+    @api.model
+    def _api_search_page(self, domain, cursor=None, limit=100, reverse=False):
+        """Search one page after ``cursor``, return (records, next_cursor)
+
+        The page is read by the queries of _api_page_segments, the tail of
+        records without a key only once the keyed records run out, so the
+        cost of a page does not grow with its depth. With ``reverse`` the page
+        walks the opposite order and its records are returned in that order.
+        """
+        self.flush_model([self._api_keyset])
+        ids = []
+        for condition, order in self._api_page_segments(cursor, reverse):
+            query = self._search(domain, limit=limit + 1 - len(ids), order=order)
+            query.add_where(condition)
+            self.env.cr.execute(query.select())
+            ids += [row[0] for row in self.env.cr.fetchall()]
+            if len(ids) > limit:
+                break
+        records = self.browse(ids)
+        if len(records) <= limit:
+            return records, None
+        records = records[:limit]
+        return records, self._api_encode_cursor(records[-1][self._api_keyset], records[-1].id)
+
+    @api.model
+    def _api_encode_cursor(self, value, record_id):
+        """Opaque cursor of a (keyset value, id) position, exact to the microsecond"""
+        payload = json.dumps([value.isoformat() if value else None, record_id])
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @api.model
+    def _api_decode_cursor(self, cursor):
+        try:
+            value, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return datetime.fromisoformat(value) if value else None, int(record_id)
+        except (ValueError, TypeError) as e:
+            raise ValueError('Invalid cursor') from e
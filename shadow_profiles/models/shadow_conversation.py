@@ -1,8 +1,19 @@
+from datetime import datetime, timezone
+
 from odoo import models, fields, api
+from odoo.tools import SQL
+from odoo.tools.sql import create_index
+
+from .shadow_profile import check_platform, normalize_identity
+
+# Conversation channel of the platforms whose name differs
+PLATFORM_CHANNELS = {'facebook': 'messenger'}
+MAX_INGEST_EVENTS = 1000
 
 
 class ShadowConversation(models.Model):
     _name = 'shadow.conversation'
+    _inherit = ['omni.api.mixin']
     _description = 'Shadow Profile Conversation'
     _order = 'timestamp desc, id desc'
 
@@ -30,10 +41,145 @@ class ShadowConversation(models.Model):
     agent_id = fields.Many2one('res.users', string='Agent', ondelete='set null')
     is_ai_response = fields.Boolean(string='AI Response', default=False)
 
+    def init(self):
+        super().init()
+        # Keyset pagination of a profile's history, both directions walk this index
+        create_index(self.env.cr, 'shadow_conversation_profile_timestamp_id_idx', 'shadow_conversation',
+                     ['shadow_profile_id', 'timestamp DESC NULLS LAST', 'id DESC'])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        # One atomic message_count / last_contact_date update per profile,
+        # messages created without a timestamp only add to the count
+        messages = {}
+        for record in records:
+            profile_id = record.shadow_profile_id.id
+            count, last_contact = messages.get(profile_id, (0, None))
+            if record.timestamp and (not last_contact or record.timestamp > last_contact):
+                last_contact = record.timestamp
+            messages[profile_id] = (count + 1, last_contact)
+        self.env['shadow.profile']._record_messages(messages)
+        return records
+
     @api.model
-    def create(self, vals):
-        record = super().create(vals)
-        # Update last_contact_date on shadow profile
-        if record.shadow_profile_id:
-            record.shadow_profile_id.write({'last_contact_date': record.timestamp})
-        return record
+    def ingest(self, events):
+        """Record a batch of channel messages, creating the unknown profiles
+
+        Profiles are resolved or created in one statement, conversations are
+        inserted with one create(), which updates each touched profile once.
+
+        :param events: dicts with platform, platform_id, message and optional
+            name, direction (default incoming), channel and timestamp (ISO 8601
+            or epoch seconds, default now)
+        :return: (results, errors), one {index, shadow_id, conversation_id,
+            created} per recorded event and one {index, error} per invalid event
+        """
+        if len(events) > MAX_INGEST_EVENTS:
+            raise ValueError(f'At most {MAX_INGEST_EVENTS} events per batch')
+
+        channels = self._fields['channel'].get_values(self.env)
+        valid, errors = [], []
+        for index, event in enumerate(events):
+            try:
+                platform = event.get('platform')
+                external_id = normalize_identity(platform, event.get('platform_id'))
+                if not platform or not external_id:
+                    raise ValueError('platform and platform_id required')
+                check_platform(platform)
+                if not event.get('message'):
+                    raise ValueError('message is required')
+                channel = event.get('channel') or PLATFORM_CHANNELS.get(platform, platform)
+                if channel not in channels:
+                    raise ValueError(f'Invalid channel {channel}')
+                direction = event.get('direction') or 'incoming'
+                if direction not in ('incoming', 'outgoing'):
+                    raise ValueError('direction must be incoming or outgoing')
+                timestamp = self._parse_timestamp(event.get('timestamp'))
+            except (ValueError, TypeError, OverflowError, AttributeError) as e:
+                errors.append({'index': index, 'error': str(e)})
+                continue
+            valid.append((index, (platform, external_id), {
+                'channel': channel,
+                'message': event['message'],
+                'direction': direction,
+                'timestamp': timestamp,
+            }, event))
+        if not valid:
+            return [], errors
+
+        identities = {}
+        for index, key, vals, event in valid:
+            identities.setdefault(key, (event['platform_id'], event.get('name')))
+        profiles = self.env['shadow.profile']._find_or_create_many(identities, touch=False)
+
+        conversations = self.create([
+            dict(vals, shadow_profile_id=profiles[key][0]) for index, key, vals, event in valid
+        ])
+
+        results = [
+            {
+                'index': index,
+                'shadow_id': profiles[key][0],
+                'conversation_id': conversation.id,
+                'created': profiles[key][1],
+            }
+            for (index, key, vals, event), conversation in zip(valid, conversations)
+        ]
+        return results, errors
+
+    @api.model
+    def _parse_timestamp(self, value):
+        """Naive UTC datetime of an ISO 8601 string or epoch seconds, now when empty"""
+        if value in (None, ''):
+            return fields.Datetime.now()
+        if isinstance(value, str) and value.isdigit():
+            value = int(value)
+        if isinstance(value, (int, float)):
+            value = datetime.fromtimestamp(value, timezone.utc)
+        else:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if value.tzinfo:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.replace(microsecond=0)
+
+    @api.model
+    def _export_query(self, date_from=None, date_to=None, shadow_profile_id=None,
+                      channel=None, direction=None):
+        """Return (columns, query) of the conversation export, timestamp in [date_from, date_to)"""
+        self.env.flush_all()
+        conditions = [SQL("TRUE")]
+        if date_from:
+            conditions.append(SQL("c.timestamp >= %s", fields.Datetime.to_datetime(date_from)))
+        if date_to:
+            conditions.append(SQL("c.timestamp < %s", fields.Datetime.to_datetime(date_to)))
+        if shadow_profile_id:
+            conditions.append(SQL("c.shadow_profile_id = %s", int(shadow_profile_id)))
+        if channel:
+            conditions.append(SQL("c.channel = %s", channel))
+        if direction:
+            conditions.append(SQL("c.direction = %s", direction))
+
+        columns = [
+            'id', 'shadow_profile_id', 'channel', 'message', 'direction',
+            'timestamp', 'agent_id', 'is_ai_response',
+        ]
+        query = SQL("""
+            SELECT c.id, c.shadow_profile_id, c.channel, c.message, c.direction,
+                   c.timestamp, c.agent_id, c.is_ai_response
+              FROM shadow_conversation c
+             WHERE %s
+             ORDER BY c.timestamp, c.id
+        """, SQL(" AND ").join(conditions))
+        return columns, query
+
+    # API payload, serialized in bulk by omni.api.mixin
+    _api_fields = {
+        'id': ('id', 'value'),
+        'channel': ('channel', 'value'),
+        'message': ('message', 'value'),
+        'direction': ('direction', 'value'),
+        'timestamp': ('timestamp', 'datetime'),
+        'is_ai_response': ('is_ai_response', 'value'),
+    }
+    _api_keyset = 'timestamp'
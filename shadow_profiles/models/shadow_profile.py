@@ -1,8 +1,39 @@
 from odoo import models, fields, api
+from odoo.tools import SQL
+from odoo.tools.sql import create_index
+
+# Profile columns indexed as external identities (shadow.profile.identity),
+# platform -> field, in lookup priority order
+IDENTITY_FIELDS = {
+    'phone': 'phone',
+    'whatsapp': 'whatsapp_id',
+    'facebook': 'facebook_id',
+    'instagram': 'instagram_id',
+    'telegram': 'telegram_id',
+    'twitter': 'twitter_id',
+    'email': 'email',
+}
+# Platforms without a profile column, only known as identity rows
+IDENTITY_ONLY_PLATFORMS = ('website',)
+PLATFORMS = (*IDENTITY_FIELDS, *IDENTITY_ONLY_PLATFORMS)
+
+
+def check_platform(platform):
+    """Reject platforms outside PLATFORMS: a typo would create a profile no
+    column-backed identity can ever match"""
+    if platform not in PLATFORMS:
+        raise ValueError(f'Unknown platform {platform}, expected one of {", ".join(PLATFORMS)}')
+
+
+def normalize_identity(platform, external_id):
+    """Canonical form of an external id: trimmed, emails lower-cased"""
+    external_id = str(external_id).strip() if external_id else ''
+    return external_id.lower() if platform == 'email' else external_id
 
 
 class ShadowProfile(models.Model):
     _name = 'shadow.profile'
+    _inherit = ['omni.api.mixin']
     _description = 'Shadow Profile'
     _order = 'last_contact_date desc, id desc'
 
@@ -66,6 +97,17 @@ class ShadowProfile(models.Model):
         string='Conversations Count',
         compute='_compute_conversation_count'
     )
+    identity_ids = fields.One2many(
+        'shadow.profile.identity',
+        'profile_id',
+        string='External Identities'
+    )
+
+    def init(self):
+        super().init()
+        # Keyset pagination of the profile list
+        create_index(self.env.cr, 'shadow_profile_last_contact_id_idx', 'shadow_profile',
+                     ['last_contact_date DESC NULLS LAST', 'id DESC'])
 
     @api.depends('conversation_ids')
     def _compute_conversation_count(self):
@@ -76,14 +118,22 @@ class ShadowProfile(models.Model):
     def create(self, vals):
         if not vals.get('first_contact_date'):
             vals['first_contact_date'] = fields.Datetime.now()
-        return super().create(vals)
+        profile = super().create(vals)
+        self.env['shadow.profile.identity']._sync(
+            profile, [platform for platform, field in IDENTITY_FIELDS.items() if vals.get(field)]
+        )
+        return profile
 
     def write(self, vals):
         if 'partner_id' in vals and vals['partner_id']:
             vals['is_converted'] = True
             vals['status'] = 'registered'
             vals['converted_date'] = fields.Datetime.now()
-        return super().write(vals)
+        res = super().write(vals)
+        platforms = [platform for platform, field in IDENTITY_FIELDS.items() if field in vals]
+        if platforms:
+            self.env['shadow.profile.identity']._sync(self, platforms)
+        return res
 
     def action_qualify(self):
         """Mark shadow profile as qualified"""
@@ -116,65 +166,192 @@ class ShadowProfile(models.Model):
 
     @api.model
     def find_or_create(self, platform, platform_id, name=None):
-        """Find existing shadow profile or create new one"""
-        field_map = {
-            'whatsapp': 'whatsapp_id',
-            'facebook': 'facebook_id',
-            'instagram': 'instagram_id',
-            'telegram': 'telegram_id',
-        }
-        field_name = field_map.get(platform)
-        if not field_name:
+        """Find existing shadow profile or create new one, touching last_contact_date"""
+        external_id = normalize_identity(platform, platform_id)
+        if not platform or not external_id:
             return False
+        check_platform(platform)
+        profiles = self._find_or_create_many({(platform, external_id): (platform_id, name)})
+        return self.browse(profiles[platform, external_id][0])
 
-        # Search for existing
-        profile = self.search([(field_name, '=', platform_id)], limit=1)
-        if profile:
-            profile.write({'last_contact_date': fields.Datetime.now()})
-            return profile
-
-        # Create new
-        vals = {
-            'name': name or f'{platform}_{platform_id}',
-            field_name: platform_id,
-            'source_channel': platform,
+    @api.model
+    def _find_or_create_many(self, identities, touch=True):
+        """Resolve or create the profiles of many identities in one statement
+
+        Lookup, insert and touch upsert the unique identity key: concurrent
+        requests for a new contact cannot create duplicates. A new profile id
+        is reserved from the sequence by its identity row, the foreign key is
+        checked at the end of the statement.
+
+        :param identities: {(platform, normalized external id): (raw id, name)}
+        :param touch: set last_contact_date of existing profiles to now
+        :return: {(platform, external id): (profile id, created)}
+        """
+        if not identities:
+            return {}
+        for platform, _external_id in identities:
+            check_platform(platform)
+        now = fields.Datetime.now()
+        channels = self._fields['source_channel'].get_values(self.env)
+        # Sorted keys: concurrent batches lock identity rows in the same order
+        keys = sorted(identities)
+        constants = {
+            **self.default_get(list(self._fields)),
             'status': 'anonymous',
+            'first_contact_date': now,
+            'last_contact_date': now,
+            'create_uid': self.env.uid,
+            'create_date': now,
+            'write_uid': self.env.uid,
+            'write_date': now,
+        }
+        constants = {
+            key: self._fields[key].convert_to_column(value, self)
+            for key, value in constants.items()
+            if self._fields[key].column_type
+            and key not in ('name', 'source_channel', *IDENTITY_FIELDS.values())
+        }
+        # Per row values, platforms without a profile column only get an identity row
+        columns = ['name', 'source_channel', *IDENTITY_FIELDS.values(), *constants]
+        values = [
+            SQL("i.name"),
+            SQL("i.source_channel"),
+            *(SQL("CASE WHEN i.platform = %s THEN i.raw_id END", platform) for platform in IDENTITY_FIELDS),
+            *(SQL("%s", value) for value in constants.values()),
+        ]
+
+        self.flush_model(['last_contact_date'])
+        self.env.cr.execute(SQL("""
+            WITH input AS (
+                SELECT *
+                  FROM unnest(%(platforms)s::varchar[], %(external_ids)s::varchar[],
+                              %(raw_ids)s::varchar[], %(names)s::varchar[], %(channels)s::varchar[])
+                       WITH ORDINALITY AS t(platform, external_id, raw_id, name, source_channel, rank)
+            ),
+            claim AS (
+                INSERT INTO shadow_profile_identity (platform, external_id, profile_id)
+                SELECT platform, external_id, nextval('shadow_profile_id_seq')
+                  FROM input
+                 ORDER BY rank
+                ON CONFLICT (platform, external_id) DO UPDATE SET platform = EXCLUDED.platform
+                RETURNING platform, external_id, profile_id, xmax = 0 AS created
+            ),
+            created AS (
+                INSERT INTO shadow_profile (id, %(columns)s)
+                SELECT c.profile_id, %(values)s
+                  FROM claim c
+                  JOIN input i ON i.platform = c.platform AND i.external_id = c.external_id
+                 WHERE c.created
+                RETURNING id
+            ),
+            touched AS (
+                UPDATE shadow_profile p
+                   SET last_contact_date = %(now)s, write_date = %(now)s, write_uid = %(uid)s
+                  FROM claim c
+                 WHERE p.id = c.profile_id AND NOT c.created AND %(touch)s
+                RETURNING p.id
+            )
+            SELECT platform, external_id, profile_id, created FROM claim
+        """,
+            platforms=[key[0] for key in keys],
+            external_ids=[key[1] for key in keys],
+            raw_ids=[str(identities[key][0]) for key in keys],
+            names=[identities[key][1] or f'{key[0]}_{identities[key][0]}' for key in keys],
+            channels=[key[0] if key[0] in channels else 'other' for key in keys],
+            columns=SQL(", ").join(SQL.identifier(column) for column in columns),
+            values=SQL(", ").join(values),
+            now=now,
+            uid=self.env.uid,
+            touch=touch,
+        ))
+        profiles = {
+            (platform, external_id): (profile_id, created)
+            for platform, external_id, profile_id, created in self.env.cr.fetchall()
         }
-        return self.create(vals)
+        self.invalidate_model()
+        self.env['shadow.profile.identity'].invalidate_model()
+        return profiles
+
+    @api.model
+    def _record_messages(self, messages):
+        """Add messages to their profiles with one atomic UPDATE
+
+        :param messages: {profile id: (message count, last message timestamp
+            or None)}, GREATEST ignores NULLs so a None timestamp leaves
+            last_contact_date as it is
+        """
+        if not messages:
+            return
+        ids = sorted(messages)
+        self.flush_model(['message_count', 'last_contact_date'])
+        self.env.cr.execute("""
+            UPDATE shadow_profile p
+               SET message_count = COALESCE(p.message_count, 0) + v.count,
+                   last_contact_date = GREATEST(p.last_contact_date, v.last_contact),
+                   write_date = %s, write_uid = %s
+              FROM unnest(%s::int[], %s::int[], %s::timestamp[]) AS v(id, count, last_contact)
+             WHERE p.id = v.id
+        """, [
+            fields.Datetime.now(), self.env.uid,
+            ids,
+            [messages[profile_id][0] for profile_id in ids],
+            [messages[profile_id][1] or None for profile_id in ids],
+        ])
+        self.browse(ids).invalidate_recordset(['message_count', 'last_contact_date', 'write_date', 'write_uid'])
+
+    @api.model
+    def search_by_identity(self, platform, external_id):
+        """Profile owning an external identity of one platform"""
+        return self.browse(self.env['shadow.profile.identity']._resolve(platform, external_id))
 
     @api.model
     def search_by_identifier(self, identifier):
-        """Search by phone or any social ID"""
-        domain = [
-            '|', '|', '|', '|', '|',
-            ('phone', '=', identifier),
-            ('whatsapp_id', '=', identifier),
-            ('facebook_id', '=', identifier),
-            ('instagram_id', '=', identifier),
-            ('telegram_id', '=', identifier),
-            ('email', '=', identifier),
-        ]
-        return self.search(domain, limit=1)
+        """Search by phone, email or any social ID"""
+        return self.browse(self.env['shadow.profile.identity']._resolve_any(identifier))
 
-    def to_dict(self):
-        """Convert to dictionary for API response"""
-        self.ensure_one()
-        return {
-            'id': self.id,
-            'name': self.name,
-            'phone': self.phone,
-            'email': self.email,
-            'status': self.status,
-            'whatsapp_id': self.whatsapp_id,
-            'facebook_id': self.facebook_id,
-            'instagram_id': self.instagram_id,
-            'telegram_id': self.telegram_id,
-            'location': self.location,
-            'interests': self.interests,
-            'source_channel': self.source_channel,
-            'is_converted': self.is_converted,
-            'partner_id': self.partner_id.id if self.partner_id else None,
-            'message_count': self.message_count,
-            'first_contact_date': self.first_contact_date.isoformat() if self.first_contact_date else None,
-            'last_contact_date': self.last_contact_date.isoformat() if self.last_contact_date else None,
-        }
+    @api.model
+    def get_stats(self, date_from=None, date_to=None):
+        """Profile counts by status and channel from one grouped query
+
+        With a date range, only profiles first contacted in [date_from, date_to) are counted.
+        """
+        domain = []
+        if date_from:
+            domain.append(('first_contact_date', '>=', date_from))
+        if date_to:
+            domain.append(('first_contact_date', '<', date_to))
+
+        stats = dict.fromkeys(['total', *self._fields['status'].get_values(self.env), 'converted'], 0)
+        by_channel = dict.fromkeys(self._fields['source_channel'].get_values(self.env), 0)
+        groups = self._read_group(domain, ['status', 'source_channel', 'is_converted'], ['__count'])
+        for status, channel, is_converted, count in groups:
+            stats['total'] += count
+            stats[status] += count
+            if is_converted:
+                stats['converted'] += count
+            if channel:
+                by_channel[channel] += count
+        stats['by_channel'] = by_channel
+        return stats
+
+    # API payload, serialized in bulk by omni.api.mixin
+    _api_fields = {
+        'id': ('id', 'value'),
+        'name': ('name', 'value'),
+        'phone': ('phone', 'value'),
+        'email': ('email', 'value'),
+        'status': ('status', 'value'),
+        'whatsapp_id': ('whatsapp_id', 'value'),
+        'facebook_id': ('facebook_id', 'value'),
+        'instagram_id': ('instagram_id', 'value'),
+        'telegram_id': ('telegram_id', 'value'),
+        'location': ('location', 'value'),
+        'interests': ('interests', 'value'),
+        'source_channel': ('source_channel', 'value'),
+        'is_converted': ('is_converted', 'value'),
+        'partner_id': ('partner_id', 'id'),
+        'message_count': ('message_count', 'value'),
+        'first_contact_date': ('first_contact_date', 'datetime'),
+        'last_contact_date': ('last_contact_date', 'datetime'),
+    }
+    _api_keyset = 'last_contact_date'
@@ -0,0 +1,159 @@
+import logging
+
+from odoo import models, fields, api
+from odoo.exceptions import ValidationError
+from odoo.tools import SQL
+
+from .shadow_profile import IDENTITY_FIELDS, normalize_identity
+
+_logger = logging.getLogger(__name__)
+
+
+class ShadowProfileIdentity(models.Model):
+    _name = 'shadow.profile.identity'
+    _description = 'Shadow Profile External Identity'
+    _log_access = False
+    _rec_name = 'external_id'
+    _order = 'platform, external_id'
+
+    # One row per (platform, external id), so resolving any identifier is a
+    # single index probe. Rows of the profile columns (IDENTITY_FIELDS) are
+    # kept in sync by shadow.profile; other platforms (e.g. website visitor
+    # ids) only exist here and need no schema change.
+    platform = fields.Char(string='Platform', required=True)
+    external_id = fields.Char(string='External ID', required=True, index=True)
+    profile_id = fields.Many2one(
+        'shadow.profile',
+        string='Shadow Profile',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+
+    _sql_constraints = [
+        ('identity_unique', 'unique(platform, external_id)',
+         'This external identity already belongs to a shadow profile!'),
+    ]
+
+    def init(self):
+        self._backfill()
+
+    @api.model
+    def _backfill(self):
+        """Index the identity columns of profiles inserted without the ORM
+
+        Existing identities are kept, a duplicated id stays with the oldest profile.
+        """
+        candidates = SQL(", ").join(
+            SQL("(%s, %s)", platform, self._normalized_column(platform, field))
+            for platform, field in IDENTITY_FIELDS.items()
+        )
+        self.env.cr.execute(SQL("""
+            INSERT INTO shadow_profile_identity (platform, external_id, profile_id)
+            SELECT v.platform, v.external_id, p.id
+              FROM shadow_profile p
+             CROSS JOIN LATERAL (VALUES %s) AS v(platform, external_id)
+             WHERE v.external_id != ''
+             ORDER BY p.id
+            ON CONFLICT (platform, external_id) DO NOTHING
+        """, candidates))
+        if self.env.cr.rowcount:
+            _logger.info("Indexed %s shadow profile identities", self.env.cr.rowcount)
+
+    @api.model
+    def _normalized_column(self, platform, field):
+        """SQL of normalize_identity() applied to a profile column (alias "p")"""
+        column = SQL("btrim(%s, E' \\t\\r\\n')", SQL.identifier('p', field))
+        return SQL("lower(%s)", column) if platform == 'email' else column
+
+    @api.model
+    def _sync(self, profiles, platforms=None):
+        """Mirror the identity columns of ``profiles`` into the identity table
+
+        :param platforms: platforms whose column changed (all when None)
+        :raise ValidationError: when an identity belongs to another profile
+        """
+        platforms = [p for p in IDENTITY_FIELDS if platforms is None or p in platforms]
+        if not profiles or not platforms:
+            return
+        columns = [IDENTITY_FIELDS[platform] for platform in platforms]
+        profiles.flush_recordset(columns)
+        wanted = sorted(
+            (platform, external_id, row['id'])
+            for row in profiles.read(columns, load=None)
+            for platform in platforms
+            if (external_id := normalize_identity(platform, row[IDENTITY_FIELDS[platform]]))
+        )
+        params = {
+            'profile_ids': tuple(profiles.ids),
+            'platforms': tuple(platforms),
+            'wanted_platforms': [w[0] for w in wanted],
+            'wanted_ids': [w[1] for w in wanted],
+            'wanted_profiles': [w[2] for w in wanted],
+        }
+        cr = self.env.cr
+        # Drop the identities the profiles no longer carry, then claim the current ones
+        cr.execute("""
+            DELETE FROM shadow_profile_identity i
+             WHERE i.profile_id IN %(profile_ids)s
+               AND i.platform IN %(platforms)s
+               AND (i.platform, i.external_id, i.profile_id) NOT IN (
+                    SELECT * FROM unnest(%(wanted_platforms)s::varchar[], %(wanted_ids)s::varchar[],
+                                         %(wanted_profiles)s::int[])
+               )
+        """, params)
+        if wanted:
+            cr.execute("""
+                INSERT INTO shadow_profile_identity (platform, external_id, profile_id)
+                SELECT * FROM unnest(%(wanted_platforms)s::varchar[], %(wanted_ids)s::varchar[],
+                                     %(wanted_profiles)s::int[])
+                ON CONFLICT (platform, external_id) DO NOTHING
+            """, params)
+            cr.execute("""
+                SELECT w.platform, w.external_id
+                  FROM unnest(%(wanted_platforms)s::varchar[], %(wanted_ids)s::varchar[],
+                              %(wanted_profiles)s::int[]) AS w(platform, external_id, profile_id)
+                  JOIN shadow_profile_identity i
+                    ON i.platform = w.platform AND i.external_id = w.external_id
+                 WHERE i.profile_id != w.profile_id
+                 LIMIT 1
+            """, params)
+            taken = cr.fetchone()
+            if taken:
+                raise ValidationError(
+                    "%s identity %s already belongs to another shadow profile!" % taken
+                )
+        self.invalidate_model()
+
+    @api.model
+    def _resolve(self, platform, external_id):
+        """Id of the profile owning an external identity, None when unknown"""
+        self.env.cr.execute("""
+            SELECT profile_id
+              FROM shadow_profile_identity
+             WHERE platform = %s AND external_id = %s
+        """, [platform, normalize_identity(platform, external_id)])
+        row = self.env.cr.fetchone()
+        return row[0] if row else None
+
+    @api.model
+    def _resolve_any(self, identifier):
+        """Id of the most recently contacted profile owning ``identifier`` on any platform"""
+        identifier = normalize_identity(None, identifier)
+        if not identifier:
+            return None
+        self.env['shadow.profile'].flush_model(['last_contact_date'])
+        self.env.cr.execute("""
+            SELECT i.profile_id
+              FROM shadow_profile_identity i
+              JOIN shadow_profile p ON p.id = i.profile_id
+             WHERE i.external_id IN %(candidates)s
+               AND (i.platform = 'email' OR i.external_id = %(identifier)s)
+             ORDER BY p.last_contact_date DESC NULLS LAST, p.id DESC
+             LIMIT 1
+        """, {
+            'candidates': (identifier, normalize_identity('email', identifier)),
+            'identifier': identifier,
+        })
+        row = self.env.cr.fetchone()
+        return row[0] if row else None
@@ -0,0 +1,4 @@
+from . import api_errors
+from . import api_params
+from . import export_stream
+from . import response_cache
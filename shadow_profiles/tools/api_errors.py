@@ -0,0 +1,7 @@
+"""Errors the REST API controllers must not turn into error responses"""
+from psycopg2 import errors
+
+# Transaction conflicts under REPEATABLE READ: handlers re-raise them so
+# Odoo's HTTP layer rolls back and retries the request instead of
+# answering success: False
+CONCURRENCY_ERRORS = (errors.SerializationFailure, errors.LockNotAvailable, errors.DeadlockDetected)
@@ -0,0 +1,41 @@
+"""Query parameters shared by the list and detail endpoints of the REST APIs"""
+from odoo import fields
+
+
+def serialize_options(kwargs):
+    """Parse the fields= and expand= query parameters (comma separated)"""
+    return {
+        key: [name.strip() for name in kwargs[key].split(',') if name.strip()]
+        for key in ('fields', 'expand') if kwargs.get(key)
+    }
+
+
+def add_total(result, Model, domain, kwargs, default='exact'):
+    """Add the total to a list response according to count=exact|estimate|none
+
+    ``total=1`` is kept as an alias of ``count=exact``, ``default`` applies
+    when neither is given.
+    """
+    mode = kwargs.get('count')
+    if not mode:
+        mode = 'exact' if kwargs.get('total') in ('1', 'true') else default
+    total, is_estimate = Model._api_count(domain, mode)
+    if total is not None:
+        result['total'] = total
+        result['total_is_estimate'] = is_estimate
+
+
+def parse_datetimes(kwargs, *keys):
+    """Parse the given datetime query parameters, return {key: datetime} of those present
+
+    Raises ValueError naming the first unparsable parameter, so handlers can
+    answer 400 before any work (or stream) starts.
+    """
+    values = {}
+    for key in keys:
+        if kwargs.get(key):
+            try:
+                values[key] = fields.Datetime.to_datetime(kwargs[key])
+            except ValueError:
+                raise ValueError(f'{key} must be a date or datetime (YYYY-MM-DD[ HH:MM:SS])') from None
+    return values
@@ -0,0 +1,53 @@
+"""Streaming exports read through a server-side PostgreSQL cursor.
+
+The generator opens its own cursor: it is consumed by the WSGI server after
+the request cursor has been closed. Rows are fetched FETCH_SIZE at a time,
+so memory use does not depend on the size of the export.
+"""
+import csv
+import io
+import json
+from datetime import date
+
+from odoo.tools import SQL
+
+FETCH_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+
+def _encode_value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def stream_export(registry, query, columns, fmt='ndjson'):
+    """Yield the rows of ``query`` encoded as NDJSON lines or CSV, chunk by chunk"""
+    with registry.cursor() as cr:
+        cr.execute(SQL("DECLARE omni_export NO SCROLL CURSOR FOR %s", query))
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == 'csv':
+            writer.writerow(columns)
+        while True:
+            cr.execute("FETCH %s FROM omni_export", [FETCH_SIZE])
+            rows = cr.fetchall()
+            if not rows:
+                break
+            for row in rows:
+                values = [_encode_value(value) for value in row]
+                if fmt == 'csv':
+                    writer.writerow(values)
+                else:
+                    buffer.write(json.dumps(dict(zip(columns, values)), default=str))
+                    buffer.write('\n')
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+        cr.execute("CLOSE omni_export")
@@ -0,0 +1,37 @@
+"""In-process cache of serialized API responses.
+
+Entries are keyed by the request and the version stamp of the data the
+response is built from, so an entry never goes stale: a change produces a
+new key and the old entry ages out of the LRU. Each worker process keeps its
+own CACHE_SIZE most recently used bodies.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+CACHE_SIZE = 256
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def response_etag(key):
+    """Strong entity tag of a cache key (unquoted)"""
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+def get_cached(key):
+    """Return the cached body of ``key`` or None"""
+    with _cache_lock:
+        body = _cache.get(key)
+        if body is not None:
+            _cache.move_to_end(key)
+        return body
+
+
+def put_cached(key, body):
+    with _cache_lock:
+        _cache[key] = body
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)